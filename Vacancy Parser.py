@@ -1,380 +1,80 @@
-import requests
-import json
-from bs4 import BeautifulSoup
-import pandas as pd
-from datetime import datetime
-import re
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.styles import Alignment, PatternFill
-from urllib.parse import urlparse
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import sys
+
+from vacancy_metrics import metrics, serve_metrics
+from vacancy_parser import (
+    BUNDLED_ROLES_SNAPSHOT_PATH,
+    DEFAULT_CHECKPOINT_DIR,
+    DEFAULT_PARSE_WORKERS,
+    MAX_PAGES,
+    ROLES_API_URL,
+    SINK_TYPES,
+    HttpCache,
+    VacancyIndex,
+    create_specialization_lookup_table,
+    fetch_specializations_from_api,
+    is_valid_hh_url,
+    load_specialization_lookup,
+    parse_hh_vacancies_async,
+    parse_hh_vacancies_sharded_async,
+    write_roles_snapshot,
+    write_vacancies_async,
+)
+
+# Стадии, нагружающие процессор: их можно профилировать cProfile и tracemalloc
+PROFILED_STAGES = ["parse", "normalize", "dates", "export"]
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Парсер вакансий hh.ru с выгрузкой в Excel и другие форматы.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="выводить только предупреждения и ошибки")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="подробный журнал: каждая загружаемая страница и пропущенные дубликаты")
+    parser.add_argument("--metrics-json", help="записать метрики прогона в JSON-файл")
+    parser.add_argument("--metrics-port", type=int,
+                        help="отдавать метрики в формате Prometheus на http://127.0.0.1:ПОРТ/metrics")
+    parser.add_argument("--profile-dir", help="профилировать горячие стадии cProfile и сохранить профили в каталог")
+    parser.add_argument("--trace-memory", action="store_true", help="замерять пик памяти горячих стадий (tracemalloc)")
+    parser.add_argument("--resume", action="store_true",
+                        help="сохранять контрольные точки и продолжать прерванный обход того же поиска "
+                             "(отклики догруженных ранее страниц будут из прошлого прогона)")
+    parser.add_argument("--roles-url", default=ROLES_API_URL, help="адрес справочника professional_roles")
+    parser.add_argument("--update-roles-snapshot", action="store_true",
+                        help="скачать справочник специализаций в снимок для сборки и выйти")
+    return parser.parse_args()
 
-def format_date_time_separate(iso_date_string):
-    if iso_date_string is None or iso_date_string == "Не найдено" or iso_date_string == "Автообновление не настроено":
-        return "", ""
-    try:
-        if '.' in iso_date_string:
-            iso_date_string = iso_date_string.split('.')[0]
-        if '+' in iso_date_string:
-            iso_date_string = iso_date_string.split('+')[0]
-        elif 'Z' in iso_date_string:
-            iso_date_string = iso_date_string.replace('Z', '')
-
-        dt_object = datetime.strptime(iso_date_string, "%Y-%m-%dT%H:%M:%S")
-        return dt_object.strftime("%d.%m.%Y"), dt_object.strftime("%H:%M")
-    except ValueError:
-        print(f"Предупреждение: Не удалось распарсить дату/время '{iso_date_string}'.")
-        return iso_date_string, ""
-
-def fetch_specializations_from_api(api_url: str) -> dict:
-    print(f"Получение справочника специализаций с {api_url}...")
-    try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        print("Справочник специализаций успешно получен.")
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при получении справочника специализаций с API: {e}")
-        return {}
-    except json.JSONDecodeError as e:
-        print(f"Ошибка декодирования JSON при получении справочника специализаций: {e}")
-        return {}
-
-def create_specialization_lookup_table(json_data: dict) -> dict:
-    lookup_table = {}
-    if "categories" in json_data and isinstance(json_data["categories"], list):
-        for category in json_data["categories"]:
-            if "roles" in category and isinstance(category["roles"], list):
-                for role in category["roles"]:
-                    if "id" in role and "name" in role:
-                        lookup_table[str(role["id"])] = role["name"]
-    return lookup_table
-
-def parse_hh_vacancies(base_url: str, max_pages: int, specialization_lookup: dict = None) -> list[dict]:
-    all_vacancies_data = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-
-    vacancy_counter = 0
-    max_pages = 20 if max_pages == 0 or max_pages > 20 else max_pages
-    seen_vacancy_links = set()
-
-    if "&items_on_page=" not in base_url:
-        base_url += "&items_on_page=100"
-    else:
-        base_url = re.sub(r"&items_on_page=\d+", "&items_on_page=100", base_url)
-
-    for current_page in range(max_pages):
-        page_url = f"{base_url}&page={current_page}"
-        print(f"Загрузка страницы {current_page + 1}: {page_url}")
-
-        try:
-            response = requests.get(page_url, headers=headers, timeout=15)
-            response.raise_for_status()
-            html_content = response.text
-
-            soup = BeautifulSoup(html_content, 'html.parser')
-            initial_state_tag = soup.find('template', id='HH-Lux-InitialState')
-
-            if not initial_state_tag:
-                print(f"Ошибка: Тег <template id='HH-Lux-InitialState'> не найден на странице {current_page + 1}.")
-                if current_page == 0:
-                    return []
-                break
-
-            json_data_str = initial_state_tag.string
-            if not json_data_str:
-                print(
-                    f"Ошибка: JSON-строка внутри тега <template id='HH-Lux-InitialState'> пуста на странице {current_page + 1}.")
-                if current_page == 0:
-                    return []
-                break
-
-            data = json.loads(json_data_str)
-
-            current_page_vacancies = []
-            if "vacancySearchResult" in data and isinstance(data["vacancySearchResult"], dict):
-                if "vacancies" in data["vacancySearchResult"] and \
-                        isinstance(data["vacancySearchResult"]["vacancies"], list):
-                    current_page_vacancies = data["vacancySearchResult"]["vacancies"]
-                else:
-                    print(
-                        f"В 'vacancySearchResult' не найден массив 'vacancies' или он имеет неверный формат на странице {current_page + 1}.")
-            else:
-                print(
-                    f"В JSON-данных не найден ключ 'vacancySearchResult' или он имеет неверный формат на странице {current_page + 1}.")
-
-            if not current_page_vacancies:
-                print(f"На странице {current_page + 1} вакансий не найдено. Завершение парсинга.")
-                break
-
-            for vacancy in current_page_vacancies:
-                vacancy_id = vacancy.get("vacancyId")
-                vacancy_link = f"https://hh.ru/vacancy/{vacancy_id}" if vacancy_id else None
-
-                if vacancy_link and vacancy_link in seen_vacancy_links:
-                    print(f"Вакансия с ссылкой {vacancy_link} уже обработана, пропускаем.")
-                    continue
-
-                vacancy_counter += 1
-                if vacancy_link:
-                    seen_vacancy_links.add(vacancy_link)
-
-                city = vacancy.get("area", {}).get("name")
-                job_title = vacancy.get("name")
-                company_name = vacancy.get("company", {}).get("name")
-
-                compencation_mode = vacancy.get("compensation", {}).get("mode")
-                compencation_currencyCode = vacancy.get("compensation", {}).get("currencyCode")
-                if compencation_mode == 'MONTH' and compencation_currencyCode == 'RUR':
-                    compensation_from = vacancy.get("compensation", {}).get("from")
-                    compensation_to = vacancy.get("compensation", {}).get("to")
-                else:
-                    compensation_from = None
-                    compensation_to = None
-
-                work_experience = vacancy.get("workExperience")
-
-                publication_type = "Неизвестно"
-                calculated_states = vacancy.get("vacancyProperties", {}).get("calculatedStates", {}).get("HH", {})
-                premium = calculated_states.get("premium", False)
-                standard = calculated_states.get("standard", False)
-                standard_plus = calculated_states.get("standardPlus", False)
-
-                if premium:
-                    publication_type = "Премиум"
-                elif standard:
-                    publication_type = "Стандарт"
-                elif standard_plus:
-                    publication_type = "Плюс Стандарт"
-
-                creation_time_raw = vacancy.get("creationTime")
-                creation_date_formatted, creation_time_formatted = format_date_time_separate(creation_time_raw)
-
-                publication_date_obj = vacancy.get("publicationTime", {})
-                publication_date_raw = publication_date_obj.get("$") if publication_date_obj else None
-                publication_date_formatted, publication_time_formatted = format_date_time_separate(publication_date_raw)
-
-                total_responses_count = vacancy.get("totalResponsesCount")
-
-                is_adv = vacancy.get("@isAdv", False)
-                has_hh_auction = False
-                has_zp_promo = False
-                click_url = vacancy.get("clickUrl", None)
-
-                vacancy_properties = vacancy.get("vacancyProperties", {})
-                if "properties" in vacancy_properties and isinstance(vacancy_properties["properties"], list):
-                    for prop_group in vacancy_properties["properties"]:
-                        if "property" in prop_group and isinstance(prop_group["property"], list):
-                            for prop in prop_group["property"]:
-                                if prop.get("propertyType") == "HH_AUCTION":
-                                    has_hh_auction = True
-                                if prop.get("propertyType") == "ZP_PROMO":
-                                    has_zp_promo = True
-
-                professional_role_id = None
-                professional_role_name = "Неизвестно"
-                if "professionalRoleIds" in vacancy and isinstance(vacancy["professionalRoleIds"], list) and \
-                        len(vacancy["professionalRoleIds"]) > 0 and \
-                        "professionalRoleId" in vacancy["professionalRoleIds"][0] and \
-                        isinstance(vacancy["professionalRoleIds"][0]["professionalRoleId"], list) and \
-                        len(vacancy["professionalRoleIds"][0]["professionalRoleId"]) > 0:
-                    professional_role_id = str(vacancy["professionalRoleIds"][0]["professionalRoleId"][0])
-                    if specialization_lookup and professional_role_id in specialization_lookup:
-                        professional_role_name = specialization_lookup[professional_role_id]
-                    else:
-                        professional_role_name = f"ID: {professional_role_id}"
-
-                hours_since_creation = None
-                if creation_date_formatted and creation_time_formatted:
-                    try:
-                        creation_datetime_str = f"{creation_date_formatted} {creation_time_formatted}"
-                        creation_datetime_obj = datetime.strptime(creation_datetime_str, "%d.%m.%Y %H:%M")
-                        current_datetime = datetime.now()
-                        time_difference = current_datetime - creation_datetime_obj
-                        hours_since_creation = round((time_difference.total_seconds() / 3600) / 24, 2)
-                    except ValueError:
-                        hours_since_creation = "Ошибка даты/времени"
-
-                all_vacancies_data.append({
-                    "№ ": vacancy_counter,
-                    "Город": city,
-                    "Вакансия": job_title,
-                    "Опыт работы": work_experience,
-                    "Компания": company_name,
-                    "Ссылка": vacancy_link,
-                    "Тип публикации": publication_type,
-                    "HH AUCTION (Топ поиска)": "Да" if has_hh_auction else "Нет",
-                    "ЗП От": compensation_from,
-                    "ЗП До": compensation_to,
-                    "Дата создания": creation_date_formatted,
-                    "Время создания": creation_time_formatted,
-                    "Дата публикации": publication_date_formatted,
-                    "Время публикации": publication_time_formatted,
-                    "Отклики": total_responses_count,  # Изменено с "О(общ)"
-                    "Специализация": professional_role_name,
-                    "Дней Прошло": hours_since_creation
-                })
-
-        except requests.exceptions.Timeout:
-            print(f"Ошибка: Превышено время ожидания запроса для URL: {page_url}. Завершение парсинга.")
-            break
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка при запросе к URL {page_url}: {e}. Пропуск страницы.")
-            continue
-        except json.JSONDecodeError as e:
-            print(f"Ошибка при декодировании JSON на странице {current_page + 1}: {e}. Пропуск страницы.")
-            continue
-        except Exception as e:
-            print(f"Произошла непредвиденная ошибка на странице {current_page + 1}: {e}. Пропуск страницы.")
-            continue
-
-    return all_vacancies_data
-
-def save_to_excel(data: list[dict]):
-    if not data:
-        print("Нет данных для сохранения в Excel.")
-        return
-
-    # Удаляем столбец "О(2)" и переименовываем "О(общ)" в "Отклики"
-    modified_data = []
-    for row in data:
-        modified_row = {k: v for k, v in row.items() if k != "О(2)"}
-        modified_data.append(modified_row)
-
-    df = pd.DataFrame(modified_data)
-    df["Откликов в день (среднее)"] = ""
-
-    first_city = "НеизвестныйГород"
-    for row in modified_data:
-        if "Город" in row and row["Город"]:
-            first_city = re.sub(r'[\\/:*?"<>|]', '_', row["Город"])
-            break
-
-    current_date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    file_name = f"{first_city}_{current_date}.xlsx"
-
-    try:
-        df.to_excel(file_name, index=False, engine='openpyxl')
-        wb = openpyxl.load_workbook(file_name)
-        ws = wb.active
-
-        # Установка переноса текста для заголовков
-        for cell in ws[1]:
-            cell.alignment = Alignment(wrapText=True)
-
-        # Определяем индексы столбцов для формулы, столбца "Ссылка" и "Компания"
-        header_row = ws[1]
-        total_responses_col = None
-        days_passed_col = None
-        link_col = None
-        company_col = None
-        for idx, cell in enumerate(header_row, 1):
-            if cell.value == "Отклики":
-                total_responses_col = get_column_letter(idx)
-            if cell.value == "Дней Прошло":
-                days_passed_col = get_column_letter(idx)
-            if cell.value == "Ссылка":
-                link_col = get_column_letter(idx)
-            if cell.value == "Компания":
-                company_col = get_column_letter(idx)
-
-        # Установка формулы для "Откликов в день (среднее)"
-        if total_responses_col and days_passed_col:
-            responses_per_day_col = get_column_letter(ws.max_column)
-            for row in range(2, ws.max_row + 1):
-                ws[f"{responses_per_day_col}{row}"] = f'=IFERROR(ROUND({total_responses_col}{row}/{days_passed_col}{row},2),"")'
-
-        # Делаем ссылки кликабельными
-        if link_col:
-            for row in range(2, ws.max_row + 1):
-                cell = ws[f"{link_col}{row}"]
-                if cell.value and isinstance(cell.value, str) and cell.value.startswith('http'):
-                    cell.hyperlink = cell.value
-                    cell.style = 'Hyperlink'
-
-        # Подсветка строк для компании "Компания Апогей (Техподдержка 1С)"
-        if company_col:
-            fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # RGB(146, 208, 80)
-            for row in range(2, ws.max_row + 1):
-                company_cell = ws[f"{company_col}{row}"]
-                if company_cell.value == "Компания Апогей (Техподдержка 1С)":
-                    for col in range(1, ws.max_column + 1):
-                        cell = ws[f"{get_column_letter(col)}{row}"]
-                        cell.fill = fill
-
-        # Создаём таблицу Excel
-        tab = Table(displayName="VacancyTable", ref=f"A1:{get_column_letter(ws.max_column)}{ws.max_row}")
-        style = TableStyleInfo(
-            name="TableStyleMedium2",
-            showFirstColumn=False,
-            showLastColumn=False,
-            showRowStripes=True,
-            showColumnStripes=False
-        )
-        tab.tableStyleInfo = style
-        ws.add_table(tab)
-
-        # Установка ширины столбцов в пикселях (переводим в единицы openpyxl: 1 единица = 9 пикселей)
-        column_widths_pixels = {
-            "№ ": 40,
-            "Город": 128,
-            "Вакансия": 263,
-            "Опыт работы": 133,
-            "Компания": 143,
-            "Ссылка": 65,
-            "Тип публикации": 125,
-            "HH AUCTION (Топ поиска)": 83,
-            "ЗП От": 70,
-            "ЗП До": 70,
-            "Дата создания": 100,
-            "Время создания": 60,
-            "Дата публикации": 100,
-            "Время публикации": 60,
-            "Отклики": 60,
-            "Специализация": 220,
-            "Дней Прошло": 70,
-            "Откликов в день (среднее)": 70
-        }
-
-        for idx, cell in enumerate(header_row, 1):
-            column_letter = get_column_letter(idx)
-            header = cell.value
-            if header in column_widths_pixels:
-                width_in_units = column_widths_pixels[header] / 9
-                ws.column_dimensions[column_letter].width = width_in_units
-
-        wb.save(file_name)
-        print(f"\nДанные успешно сохранены в файл: {file_name}")
-    except Exception as e:
-        print(f"Ошибка при сохранении в Excel: {e}")
-
-def is_valid_hh_url(url: str) -> bool:
-    if not url:
-        return False
-    try:
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        parsed_url = urlparse(url)
-        if not parsed_url.netloc.endswith('hh.ru'):
-            return False
-        if 'search/vacancy' not in parsed_url.path:
-            return False
-        return True
-    except Exception:
-        return False
 
 if __name__ == "__main__":
-    specialization_api_url = "https://api.hh.ru/professional_roles"
-    specialization_json_data = fetch_specializations_from_api(specialization_api_url)
-
-    specializations_map = {}
-    if specialization_json_data:
-        specializations_map = create_specialization_lookup_table(specialization_json_data)
-    else:
+    # Нужно для пула процессов разбора в собранном exe
+    multiprocessing.freeze_support()
+    args = parse_arguments()
+    log_level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(message)s", stream=sys.stdout)
+    # httpx пишет каждый запрос на уровне INFO; они нужны только в подробном журнале
+    logging.getLogger("httpx").setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    if args.profile_dir or args.trace_memory:
+        metrics.enable_profiling(PROFILED_STAGES if args.profile_dir else None,
+                                 PROFILED_STAGES if args.trace_memory else None)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+        print(f"Метрики доступны на http://127.0.0.1:{args.metrics_port}/metrics")
+
+    if args.update_roles_snapshot:
+        # Обновление снимка справочника, который кладётся в сборку (см. vacancy_parser.spec)
+        specialization_json_data = fetch_specializations_from_api(args.roles_url)
+        if not create_specialization_lookup_table(specialization_json_data):
+            sys.exit(1)
+        write_roles_snapshot(specialization_json_data, BUNDLED_ROLES_SNAPSHOT_PATH)
+        print(f"Снимок справочника специализаций сохранён в {BUNDLED_ROLES_SNAPSHOT_PATH}")
+        sys.exit(0)
+
+    http_cache = HttpCache()
+    # Справочник берётся из снимка и при необходимости обновляется в фоне, пока вводятся параметры
+    specializations_map, roles_refresh = load_specialization_lookup(args.roles_url)
+    if not specializations_map:
         print(
             "Не удалось получить справочник специализаций с API. Названия специализаций будут отображаться как 'ID: [числовой ID]'.")
 
@@ -387,7 +87,7 @@ if __name__ == "__main__":
         print("Ошибка: Введён пустой или неверный URL. URL должен содержать 'search/vacancy' и домен, заканчивающийся на 'hh.ru'.")
 
     while True:
-        num_pages_input = input("Введите количество страниц для парсинга (0 - все страницы, но не более 20): ").strip()
+        num_pages_input = input("Введите количество страниц для парсинга (до 20; 0 - вся выдача с разбиением на подзапросы): ").strip()
         if num_pages_input == "":
             print("Ошибка: Поле не может быть пустым. Попробуйте снова.")
             continue
@@ -400,11 +100,65 @@ if __name__ == "__main__":
         except ValueError:
             print("Ошибка: Введите число от 0 до 20.")
 
-    if num_pages_to_parse == 0 or num_pages_to_parse > 20:
-        print("Количество страниц для парсинга: 20")
-        num_pages_to_parse = 20
+    full_coverage = num_pages_to_parse == 0 or num_pages_to_parse > MAX_PAGES
+    if full_coverage:
+        print("Будет получена вся выдача: запрос разбивается на подзапросы по 2000 вакансий.")
+
+    incremental_input = input("Инкрементальный режим - только новые и изменённые вакансии (д/н, по умолчанию н): ")
+    incremental_mode = incremental_input.strip().lower() in ("д", "да", "y", "yes")
+    vacancy_index = VacancyIndex() if incremental_mode else None
 
-    all_extracted_data = parse_hh_vacancies(base_url_input, num_pages_to_parse, specializations_map)
-    save_to_excel(all_extracted_data)
+    while True:
+        formats_input = input(f"Форматы выгрузки через запятую ({', '.join(SINK_TYPES)}; по умолчанию xlsx): ")
+        output_formats = [fmt.strip().lower().lstrip('.') for fmt in formats_input.split(',') if fmt.strip()] or ["xlsx"]
+        unknown_formats = [fmt for fmt in output_formats if fmt not in SINK_TYPES]
+        if not unknown_formats:
+            break
+        print(f"Ошибка: Неизвестные форматы: {', '.join(unknown_formats)}. Попробуйте снова.")
 
-    print("\nПарсинг завершен.")
\ No newline at end of file
+    sinks = []
+    for output_format in dict.fromkeys(output_formats):
+        try:
+            sinks.append(SINK_TYPES[output_format](with_responses_delta=incremental_mode))
+        except ImportError as e:
+            print(f"Ошибка: {e} Формат {output_format} пропущен.")
+
+    # Контрольные точки только по явному запросу: иначе повторный запуск смешал бы старые отклики со свежими
+    checkpoint_dir = DEFAULT_CHECKPOINT_DIR if args.resume else None
+    if full_coverage:
+        # Полная выдача - это сотни страниц, их разбор раскладывается по ядрам. Процессы разбора
+        # получают копию справочника, поэтому сначала дожидаемся его обновления
+        if roles_refresh is not None:
+            roles_refresh.join()
+        vacancies = parse_hh_vacancies_sharded_async(base_url_input, specializations_map,
+                                                     cache=http_cache, vacancy_index=vacancy_index,
+                                                     checkpoint_dir=checkpoint_dir,
+                                                     # Профили снимаются только в основном процессе
+                                                     parse_workers=0 if args.profile_dir else DEFAULT_PARSE_WORKERS)
+    else:
+        vacancies = parse_hh_vacancies_async(base_url_input, num_pages_to_parse, specializations_map,
+                                             cache=http_cache, vacancy_index=vacancy_index,
+                                             checkpoint_dir=checkpoint_dir)
+    # Строки уходят в файлы по мере разбора страниц, вся выдача в памяти не копится
+    try:
+        rows_written = asyncio.run(write_vacancies_async(vacancies, sinks, vacancy_index=vacancy_index))
+        if not rows_written:
+            print("Нет данных для сохранения.")
+    except Exception as e:
+        print(f"Ошибка при сохранении: {e}")
+    http_cache.close()
+    if vacancy_index:
+        vacancy_index.close()
+
+    if not args.quiet:
+        print("\nМетрики прогона:")
+        for line in metrics.summary_lines():
+            print(f"  {line}")
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+        print(f"Метрики сохранены в {args.metrics_json}")
+    if args.profile_dir:
+        for profile_path in metrics.write_profiles(args.profile_dir):
+            print(f"Профиль стадии сохранён: {profile_path}")
+
+    print("\nПарсинг завершен.")
@@ -1,16 +1,31 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# vacancy_parser импортирует тяжёлые библиотеки лениво (LazyModule), анализ сборки их не видит
+lazy_imports = [
+    'requests', 'requests.adapters', 'httpx', 'bs4', 'numpy', 'pandas',
+    'openpyxl', 'openpyxl.cell', 'openpyxl.utils', 'openpyxl.worksheet.table', 'openpyxl.styles',
+    'pyarrow', 'pyarrow.compute', 'pyarrow.dataset', 'pyarrow.parquet', 'pyarrow.fs',
+]
+# Снимок справочника специализаций, чтобы запуск не ждал api.hh.ru.
+# Перед сборкой: python "Vacancy Parser.py" --update-roles-snapshot
+roles_snapshot = os.path.join(SPECPATH, 'professional_roles.json')
+if not os.path.exists(roles_snapshot):
+    # Без снимка собранная программа при первом запуске ждала бы справочник с API
+    raise SystemExit(f'{roles_snapshot} не найден. Перед сборкой выполните: '
+                     f'python "Vacancy Parser.py" --update-roles-snapshot')
 
 a = Analysis(
     ['Vacancy Parser.py'],
     pathex=[],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=[(roles_snapshot, '.')],
+    hiddenimports=lazy_imports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # pandas подтягивает их необязательно; onefile-сборка без них меньше и быстрее распаковывается при запуске
+    excludes=['tkinter', 'matplotlib', 'IPython', 'pytest'],
     noarchive=False,
     optimize=0,
 )
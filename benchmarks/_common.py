@@ -0,0 +1,99 @@
+import html
+import json
+import random
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Записанный корпус: страницы выдачи *.html и справочник professional_roles.json (см. record_corpus.py)
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+ROLES_FILE_NAME = "professional_roles.json"
+SAMPLE_ROLES = {121: "Специалист технической поддержки", 40: "Другое", 96: "Программист, разработчик",
+                113: "Системный администратор"}
+
+
+def load_parser_module():
+    # Бенчмарки запускаются из каталога benchmarks, модуль парсера лежит в корне репозитория
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    import vacancy_parser
+    return vacancy_parser
+
+
+def build_sample_vacancy(vacancy_number: int, rnd: random.Random) -> dict:
+    return {
+        "vacancyId": 90000000 + vacancy_number,
+        "name": f"Специалист технической поддержки 1С #{vacancy_number}",
+        "area": {"name": rnd.choice(["Москва", "Санкт-Петербург", "Казань", "Новосибирск"])},
+        "company": {"name": rnd.choice(["Компания Апогей (Техподдержка 1С)", "ООО «Ромашка» & Ко", "Яндекс"])},
+        "compensation": {"mode": "MONTH", "currencyCode": "RUR",
+                         "from": rnd.choice([None, 60000, 80000]), "to": rnd.choice([None, 120000, 150000])},
+        "workExperience": rnd.choice(["noExperience", "between1And3", "between3And6", "moreThan6"]),
+        "vacancyProperties": {
+            "calculatedStates": {"HH": {"premium": rnd.random() < 0.1, "standard": True, "standardPlus": False}},
+            "properties": [{"property": [{"propertyType": rnd.choice(["HH_AUCTION", "ZP_PROMO", "HH_STANDARD"])}
+                                         for _ in range(3)]}],
+        },
+        "creationTime": f"2025-0{rnd.randint(1, 9)}-{rnd.randint(10, 28)}T{rnd.randint(10, 23)}:15:42.512+03:00",
+        "publicationTime": {"$": f"2025-0{rnd.randint(1, 9)}-{rnd.randint(10, 28)}T{rnd.randint(10, 23)}:20:00+03:00"},
+        "totalResponsesCount": rnd.randint(0, 900),
+        "professionalRoleIds": [{"professionalRoleId": [rnd.choice([121, 40, 96, 113])]}],
+        "@isAdv": False,
+        "clickUrl": None,
+        "snippet": {"requirement": "Знание 1С:Предприятие 8.3 " * 8, "responsibility": "Консультации пользователей " * 8},
+    }
+
+
+def build_sample_page(page_number: int, vacancies_on_page: int = 100, total_pages: int = 20, seed: int = 0) -> bytes:
+    # Синтетическая страница поиска, повторяющая структуру hh.ru: тяжёлая разметка + большой InitialState
+    rnd = random.Random(seed * 100003 + page_number)
+    vacancies = []
+    if page_number < total_pages:
+        vacancies = [build_sample_vacancy(page_number * vacancies_on_page + i, rnd) for i in range(vacancies_on_page)]
+    initial_state = {
+        "vacancySearchResult": {"vacancies": vacancies, "totalResults": total_pages * vacancies_on_page},
+        "router": {"location": {"pathname": "/search/vacancy"}},
+        "translations": {f"key.{i}": f"Перевод строки интерфейса номер {i}" for i in range(3000)},
+    }
+    markup = "".join(f'<div class="serp-item" data-qa="vacancy-{i}"><span class="title">Вакансия {i}</span></div>'
+                     for i in range(2000))
+    state_json = html.escape(json.dumps(initial_state, ensure_ascii=False), quote=False)
+    page = (f'<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8"><title>Работа</title></head>'
+            f'<body><div id="HH-React-Root">{markup}</div>'
+            f'<template id="HH-Lux-InitialState">{state_json}</template>'
+            f'<script>window.globalVars = {{}};</script></body></html>')
+    return page.encode("utf-8")
+
+
+def load_sample_pages(pages_dir: str = None, count: int = 5) -> list[bytes]:
+    if pages_dir:
+        pages = [path.read_bytes() for path in sorted(Path(pages_dir).glob("*.html"))]
+        if not pages:
+            raise SystemExit(f"В каталоге {pages_dir} нет сохранённых страниц (*.html).")
+        return pages
+    return [build_sample_page(page_number) for page_number in range(count)]
+
+
+def build_sample_roles() -> dict:
+    # Справочник в формате https://api.hh.ru/professional_roles для ролей из build_sample_vacancy
+    return {"categories": [{"id": "11", "name": "Информационные технологии",
+                            "roles": [{"id": str(role_id), "name": name} for role_id, name in SAMPLE_ROLES.items()]}]}
+
+
+def load_corpus(corpus_dir: str = None, synthetic_pages: int = 10) -> tuple[list[bytes], bytes, str]:
+    # Страницы и справочник ролей для бенчмарков: записанный корпус, если он есть, иначе синтетика
+    # с фиксированным seed, чтобы замеры разных запусков были сравнимы. Третье значение - описание источника
+    corpus_path = Path(corpus_dir) if corpus_dir else CORPUS_DIR
+    pages = [path.read_bytes() for path in sorted(corpus_path.glob("*.html"))] if corpus_path.is_dir() else []
+    if corpus_dir and not pages:
+        raise SystemExit(f"В каталоге {corpus_dir} нет сохранённых страниц (*.html).")
+    if not pages:
+        pages = [build_sample_page(page_number, total_pages=synthetic_pages) for page_number in range(synthetic_pages)]
+        source = f"синтетический корпус, {synthetic_pages} стр."
+    else:
+        source = f"записанный корпус {corpus_path}, {len(pages)} стр."
+
+    roles_path = corpus_path / ROLES_FILE_NAME
+    roles_body = roles_path.read_bytes() if roles_path.is_file() else \
+        json.dumps(build_sample_roles(), ensure_ascii=False).encode("utf-8")
+    return pages, roles_body, source
@@ -0,0 +1,55 @@
+# Микробенчмарк извлечения HH-Lux-InitialState: BeautifulSoup против прямого поиска в байтах.
+#
+#   python benchmarks/bench_extract.py [каталог_с_сохранёнными_страницами] [--repeat N]
+#
+# Без каталога используются синтетические страницы, похожие на выдачу hh.ru.
+import argparse
+import json
+import time
+
+from bs4 import BeautifulSoup
+
+from _common import load_parser_module, load_sample_pages
+
+
+def extract_with_soup(page_content: bytes) -> dict:
+    soup = BeautifulSoup(page_content.decode("utf-8"), "html.parser")
+    return json.loads(soup.find("template", id="HH-Lux-InitialState").string)
+
+
+def time_per_page(extract, pages: list[bytes], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page_content in pages:
+            extract(page_content)
+    return (time.perf_counter() - started) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages_dir", nargs="?")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vacancy_parser = load_parser_module()
+    pages = load_sample_pages(args.pages_dir)
+
+    def extract_fast(page_content: bytes) -> dict:
+        return vacancy_parser.loads_json(vacancy_parser.extract_initial_state_json(page_content))
+
+    for page_content in pages:
+        if extract_fast(page_content) != extract_with_soup(page_content):
+            raise SystemExit("Результаты быстрого извлечения и BeautifulSoup не совпадают.")
+
+    average_size_kb = sum(len(page_content) for page_content in pages) / len(pages) / 1024
+    soup_seconds = time_per_page(extract_with_soup, pages, args.repeat)
+    fast_seconds = time_per_page(extract_fast, pages, args.repeat)
+    print(f"Страниц: {len(pages)}, средний размер: {average_size_kb:.0f} КБ, JSON-декодер: "
+          f"{vacancy_parser.loads_json.__module__}")
+    print(f"BeautifulSoup + json.loads: {soup_seconds * 1000:8.2f} мс/страница")
+    print(f"Прямое извлечение:          {fast_seconds * 1000:8.2f} мс/страница")
+    print(f"Ускорение:                  {soup_seconds / fast_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Бенчмарк аналитики по истории откликов: расчёт "Откликов в день (среднее)" по всем снимкам
+# набора данных (Parquet и Arrow IPC) против чтения тех же строк из xlsx-выгрузок.
+#
+#   python benchmarks/bench_history.py [--rows 2000000] [--snapshots 30] [--excel-rows 20000]
+#
+# Набор данных генерируется во временном каталоге в той же раскладке, что пишет HistoryDatasetSink.
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from _common import load_parser_module
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург"]
+
+
+def build_history(vacancy_parser, root: str, file_format: str, rows: int, snapshots: int):
+    pa = vacancy_parser.pa
+    schema = vacancy_parser.history_file_schema()
+    rnd = np.random.default_rng(0)
+    rows_per_file = max(1, rows // (snapshots * len(CITIES)))
+    started_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for snapshot in range(snapshots):
+        snapshot_at = started_at + timedelta(days=snapshot)
+        for city in CITIES:
+            partition_dir = os.path.join(root, f"snapshot_date={snapshot_at:%Y-%m-%d}", f"city={city}")
+            os.makedirs(partition_dir, exist_ok=True)
+            links = rnd.integers(0, rows_per_file * 2, rows_per_file)
+            columns = {name: pa.nulls(rows_per_file, field.type) for name, field in zip(schema.names, schema)}
+            columns["link"] = pa.array([f"https://hh.ru/vacancy/{link}" for link in links.tolist()])
+            columns["responses"] = pa.array(rnd.integers(0, 500, rows_per_file))
+            columns["days_passed"] = pa.array(np.round(rnd.uniform(0, 60, rows_per_file), 2))
+            columns["snapshot_at"] = pa.array([snapshot_at] * rows_per_file, schema.field("snapshot_at").type)
+            table = pa.Table.from_pydict(columns, schema=schema)
+            path = os.path.join(partition_dir, f"part-{snapshot}.{file_format}")
+            if file_format == "arrow":
+                with pa.ipc.new_file(path, schema) as writer:
+                    writer.write_table(table)
+            else:
+                vacancy_parser.pq.write_table(table, path, compression="zstd")
+
+
+def bench_excel(vacancy_parser, directory: str, rows: int) -> float:
+    # Сколько строк в секунду удаётся прочитать обратно из xlsx, как при анализе старых выгрузок
+    vacancies = [vacancy_parser.Vacancy(
+        number=number, city="Москва", title="Специалист", experience="between1And3", company="Компания",
+        link=f"https://hh.ru/vacancy/{number}", publication_type="Стандарт", has_hh_auction=False,
+        salary_from=None, salary_to=None, creation_time_raw="2025-01-01T10:00:00+03:00",
+        publication_time_raw="2025-01-02T10:00:00+03:00", responses=number % 500, specialization="Тест")
+        for number in range(1, rows + 1)]
+    vacancy_parser.apply_timestamps(vacancies, datetime.now(timezone.utc))
+    file_name = os.path.join(directory, "history.xlsx")
+    vacancy_parser.write_vacancies(vacancies, [vacancy_parser.ExcelSink(file_name)])
+
+    started = time.perf_counter()
+    frame = pd.read_excel(file_name)
+    responses_per_day = (frame["Отклики"] / frame["Дней Прошло"]).round(2)
+    elapsed = time.perf_counter() - started
+    assert len(responses_per_day) == rows
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--snapshots", type=int, default=30)
+    parser.add_argument("--excel-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    vacancy_parser = load_parser_module()
+    if not vacancy_parser.module_available("pyarrow"):
+        raise SystemExit("Для бенчмарка нужен пакет pyarrow.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in ("parquet", "arrow"):
+            root = os.path.join(directory, file_format)
+            build_history(vacancy_parser, root, file_format, args.rows, args.snapshots)
+            started = time.perf_counter()
+            table = vacancy_parser.load_history_responses_per_day(file_format, root)
+            by_date = table.group_by("snapshot_date").aggregate([("responses_per_day", "mean")])
+            elapsed = time.perf_counter() - started
+            print(f"{file_format:8s}: строк {table.num_rows}, снимков {by_date.num_rows}, "
+                  f"{elapsed:6.2f} с ({table.num_rows / elapsed / 1e6:.1f} млн строк/с)")
+
+        excel_rows_per_second = bench_excel(vacancy_parser, directory, args.excel_rows)
+        print(f"xlsx    : {excel_rows_per_second / 1e3:.1f} тыс. строк/с "
+              f"(оценка на {args.rows} строк: {args.rows / excel_rows_per_second:.0f} с)")
+
+
+if __name__ == "__main__":
+    main()
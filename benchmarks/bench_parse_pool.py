@@ -0,0 +1,50 @@
+# Масштабирование стадии разбора страниц (извлечение JSON + нормализация вакансий) по ядрам:
+# один процесс против пула процессов на 1..N воркеров.
+#
+#   python benchmarks/bench_parse_pool.py [каталог_с_сохранёнными_страницами] [--pages 200] [--max-workers N]
+#
+# Без каталога используются синтетические страницы; корпус прокручивается по кругу до --pages страниц.
+import argparse
+import itertools
+import os
+import time
+
+from _common import load_parser_module, load_sample_pages
+
+
+def run_stage(vacancy_parser, pages: list[bytes], parse_pool=None) -> tuple[float, list]:
+    fetched_pages = ((current_page, page_content, None) for current_page, page_content in enumerate(pages))
+    started = time.perf_counter()
+    results = [(current_page, [vacancy.link for vacancy in vacancies])
+               for current_page, vacancies, _ in vacancy_parser.parse_pages(fetched_pages, parse_pool=parse_pool)]
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages_dir", nargs="?")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    vacancy_parser = load_parser_module()
+    corpus = load_sample_pages(args.pages_dir, count=20)
+    pages = list(itertools.islice(itertools.cycle(corpus), args.pages))
+    print(f"Страниц: {len(pages)}, ядер: {os.cpu_count()}")
+
+    baseline_seconds, baseline_results = run_stage(vacancy_parser, pages)
+    print(f"Один процесс:     {len(pages) / baseline_seconds:8.1f} стр/с")
+
+    for workers in range(1, args.max_workers + 1):
+        with vacancy_parser.create_parse_pool(workers) as parse_pool:
+            # Первый прогон прогревает процессы пула
+            run_stage(vacancy_parser, pages[:workers], parse_pool)
+            seconds, results = run_stage(vacancy_parser, pages, parse_pool)
+        if results != baseline_results:
+            raise SystemExit("Результаты пула процессов не совпадают с однопроцессным разбором.")
+        print(f"Пул, воркеров {workers:2d}: {len(pages) / seconds:8.1f} стр/с "
+              f"(x{baseline_seconds / seconds:.2f} к одному процессу)")
+
+
+if __name__ == "__main__":
+    main()
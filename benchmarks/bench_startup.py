@@ -0,0 +1,127 @@
+# Время запуска: импорт vacancy_parser в чистом интерпретаторе и время от старта "Vacancy Parser.py"
+# до приглашения ввести URL. Справочник специализаций отдаёт локальный replay_server.py с задержкой,
+# как у api.hh.ru, поэтому видно, ждёт ли запуск сети.
+#
+#   python benchmarks/bench_startup.py [--repeat 5] [--latency-ms 300] [--top 10] [--json отчёт.json]
+#
+# Те же замеры входят в run_benchmarks.py как стадии import_vacancy_parser и startup_to_prompt.
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _common import REPO_ROOT, load_corpus
+from replay_server import start_replay_server
+
+CLI_SCRIPT = REPO_ROOT / "Vacancy Parser.py"
+PROMPT_MARKER = "Введите базовый URL".encode("utf-8")
+# Библиотеки, импорт которых vacancy_parser откладывает до стадии, где они нужны
+HEAVY_MODULES = ["numpy", "pandas", "openpyxl", "requests", "httpx", "bs4", "pyarrow"]
+
+
+def run_python(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def best_of(repeat: int, run) -> float:
+    return min(run() for _ in range(repeat))
+
+
+def import_breakdown(module: str, top: int) -> list[tuple[str, float]]:
+    # Модули с наибольшим суммарным временем импорта по python -X importtime
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_ROOT,
+                            check=True, capture_output=True, text=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(timings, key=lambda timing: timing[1], reverse=True)[:top]
+
+
+def prepare_home(home_dir: str, roles_body: bytes, age_seconds: float = 0.0):
+    # Снимок справочника пользователя в подменённом домашнем каталоге; age_seconds - его возраст
+    snapshot_path = Path(home_dir) / ".hh_vacancy_parser" / "professional_roles.json"
+    if roles_body is None:
+        snapshot_path.unlink(missing_ok=True)
+        return
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot_path.write_bytes(roles_body)
+    modified_at = time.time() - age_seconds
+    os.utime(snapshot_path, (modified_at, modified_at))
+
+
+def time_to_prompt(home_dir: str, roles_url: str) -> float:
+    env = dict(os.environ, HOME=home_dir, USERPROFILE=home_dir, PYTHONUNBUFFERED="1")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(CLI_SCRIPT), "-q", "--roles-url", roles_url], cwd=home_dir,
+                               env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while PROMPT_MARKER not in output:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError("Vacancy Parser.py завершился, не дойдя до ввода URL.")
+            output += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=300, help="задержка ответа справочника специализаций")
+    parser.add_argument("--top", type=int, default=10, help="сколько самых медленных импортов показать")
+    parser.add_argument("--json", help="куда записать отчёт в JSON")
+    args = parser.parse_args()
+
+    _, roles_body, _ = load_corpus(args.corpus, 1)
+    server = start_replay_server([], roles_body, latency=args.latency_ms / 1000)
+    heavy_modules = [module for module in HEAVY_MODULES if importlib.util.find_spec(module)]
+
+    report = {
+        "interpreter": best_of(args.repeat, lambda: run_python("pass")),
+        "import_vacancy_parser": best_of(args.repeat, lambda: run_python("import vacancy_parser")),
+        "import_heavy_modules": best_of(args.repeat, lambda: run_python(f"import {', '.join(heavy_modules)}")),
+    }
+    print(f"Интерпретатор без импортов:      {report['interpreter'] * 1000:8.0f} мс")
+    print(f"import vacancy_parser:           {report['import_vacancy_parser'] * 1000:8.0f} мс")
+    print(f"Отложенные библиотеки целиком:   {report['import_heavy_modules'] * 1000:8.0f} мс "
+          f"({', '.join(heavy_modules)})")
+    print("Самые долгие импорты vacancy_parser (суммарно):")
+    for name, seconds in import_breakdown("vacancy_parser", args.top):
+        print(f"  {name:40s} {seconds * 1000:8.1f} мс")
+
+    scenarios = [
+        ("startup_fresh_snapshot", "свежий снимок справочника", 0.0),
+        ("startup_stale_snapshot", "устаревший снимок, обновление в фоне", 30 * 24 * 3600.0),
+        ("startup_no_snapshot", f"без снимка пользователя, API {args.latency_ms:.0f} мс", None),
+    ]
+    print("До приглашения ввести URL:")
+    with tempfile.TemporaryDirectory() as home_dir:
+        for name, title, age_seconds in scenarios:
+            def run():
+                prepare_home(home_dir, None if age_seconds is None else roles_body, age_seconds or 0.0)
+                return time_to_prompt(home_dir, server.roles_url)
+            report[name] = best_of(args.repeat, run)
+            print(f"  {title:45s} {report[name] * 1000:8.0f} мс")
+    server.shutdown()
+    server.server_close()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
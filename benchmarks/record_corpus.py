@@ -0,0 +1,39 @@
+# Запись корпуса для бенчмарков: страницы выдачи hh.ru и справочник professional_roles сохраняются
+# в benchmarks/corpus (или указанный каталог) и дальше отдаются replay_server.py без обращения к hh.ru.
+#
+#   python benchmarks/record_corpus.py "https://hh.ru/search/vacancy?text=..." [--pages 10] [--out каталог]
+import argparse
+from pathlib import Path
+
+from _common import CORPUS_DIR, ROLES_FILE_NAME, load_parser_module
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("search_url")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--out", default=str(CORPUS_DIR))
+    args = parser.parse_args()
+
+    vacancy_parser = load_parser_module()
+    if not vacancy_parser.is_valid_hh_url(args.search_url):
+        raise SystemExit("URL должен вести на поиск вакансий hh.ru (search/vacancy).")
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base_url = vacancy_parser.with_items_on_page(args.search_url)
+    rate_limiter = vacancy_parser.RateLimiter(2.0, burst=1)
+    with vacancy_parser.create_http_session(1) as session:
+        (out_dir / ROLES_FILE_NAME).write_bytes(vacancy_parser.fetch_page(session, vacancy_parser.ROLES_API_URL, rate_limiter))
+        for page in range(args.pages):
+            page_content = vacancy_parser.fetch_page(session, f"{base_url}&page={page}", rate_limiter)
+            if not vacancy_parser.extract_page_vacancies(page_content, page):
+                print(f"Страница {page + 1} пуста, запись остановлена.")
+                break
+            (out_dir / f"page_{page:03d}.html").write_bytes(page_content)
+            print(f"Записана страница {page + 1}")
+    print(f"Корпус сохранён в {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
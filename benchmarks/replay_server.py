@@ -0,0 +1,141 @@
+# Локальный сервер, отдающий записанный корпус вместо hh.ru: страницы выдачи по параметру page,
+# справочник /professional_roles, настраиваемая задержка и внедрение ошибок (429/502/503, "мёртвые" страницы).
+#
+#   python benchmarks/replay_server.py [--corpus каталог] [--port 8800] [--latency-ms 50] [--jitter-ms 20]
+#                                      [--error-rate 0.1] [--dead-page 3]
+#
+# Из кода сервер запускается в фоновом потоке через start_replay_server().
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from _common import build_sample_page, load_corpus
+
+INJECTED_STATUS_CODES = (429, 502, 503)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, pages: list[bytes], roles_body: bytes, port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, dead_pages: tuple = (), retry_after: int = 1,
+                 seed: int = 0):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.pages = pages
+        self.roles_body = roles_body
+        # Страница за концом выдачи - такая же разметка, но без вакансий
+        self.empty_page = build_sample_page(len(pages), total_pages=len(pages))
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dead_pages = set(dead_pages)
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.status_counts = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.base_url}/search/vacancy?text=benchmark"
+
+    @property
+    def roles_url(self) -> str:
+        return f"{self.base_url}/professional_roles"
+
+    def plan_response(self, page: int | None) -> tuple[float, int]:
+        # Задержка и код ответа для очередного запроса
+        with self._lock:
+            self.request_count += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if page is not None and page in self.dead_pages:
+                status = 500
+            elif self._random.random() < self.error_rate:
+                status = self._random.choice(INJECTED_STATUS_CODES)
+            else:
+                status = 200
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return delay, status
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # keep-alive, чтобы пул соединений клиента работал так же, как с hh.ru
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path.endswith("/professional_roles"):
+            page = None
+            body, content_type = server.roles_body, "application/json; charset=utf-8"
+        elif "search/vacancy" in url.path:
+            page = int(parse_qs(url.query).get("page", ["0"])[0])
+            body = server.pages[page] if page < len(server.pages) else server.empty_page
+            content_type = "text/html; charset=utf-8"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        delay, status = server.plan_response(page)
+        if delay > 0:
+            time.sleep(delay)
+        if status != 200:
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", str(server.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_replay_server(pages: list[bytes], roles_body: bytes, **options) -> ReplayServer:
+    server = ReplayServer(pages, roles_body, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus")
+    parser.add_argument("--pages", type=int, default=20, help="число синтетических страниц, если корпуса нет")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--dead-page", type=int, action="append", default=[])
+    args = parser.parse_args()
+
+    pages, roles_body, source = load_corpus(args.corpus, args.pages)
+    server = ReplayServer(pages, roles_body, port=args.port, latency=args.latency_ms / 1000,
+                          jitter=args.jitter_ms / 1000, error_rate=args.error_rate, dead_pages=args.dead_page)
+    print(f"Источник: {source}")
+    print(f"Поиск:         {server.search_url}")
+    print(f"Справочник:    {server.roles_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# Бенчмарк и проверка на регрессии по стадиям парсера без обращения к hh.ru.
+# Корпус отдаёт локальный replay_server.py; каждая стадия замеряется отдельно:
+# загрузка, извлечение InitialState, json.loads, нормализация вакансий, format_date_time_separate,
+# пакетная обработка дат и save_to_excel, а также время запуска (импорт vacancy_parser и время до ввода URL,
+# см. bench_startup.py). Для каждой стадии - пропускная способность и пик памяти.
+#
+#   python benchmarks/run_benchmarks.py [--corpus каталог] [--repeat 3] [--latency-ms 20]
+#                                       [--save-baseline] [--tolerance 0.25] [--json отчёт.json]
+#
+# С --save-baseline результаты сохраняются в benchmarks/baseline.json; без него сравниваются с ним,
+# и скрипт завершается с кодом 1, если какая-то стадия стала медленнее базовой больше чем на tolerance.
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from _common import load_corpus, load_parser_module
+from bench_startup import prepare_home, run_python, time_to_prompt
+from replay_server import start_replay_server
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+class Stage:
+    def __init__(self, name: str, unit: str, run, items: int):
+        self.name = name
+        self.unit = unit
+        self.run = run
+        self.items = items
+
+
+def build_stages(vacancy_parser, server, pages: list[bytes], roles_body: bytes, specialization_lookup: dict,
+                 fetch_workers: int, work_dir: str) -> list[Stage]:
+    # Входные данные каждой стадии готовятся заранее, чтобы замер включал только её собственную работу
+    json_strings = [vacancy_parser.extract_initial_state_json(page_content) for page_content in pages]
+    raw_vacancies = []
+    for json_string in json_strings:
+        raw_vacancies.extend(vacancy_parser.loads_json(json_string)["vacancySearchResult"]["vacancies"])
+    raw_links = [f"https://hh.ru/vacancy/{vacancy['vacancyId']}" for vacancy in raw_vacancies]
+    vacancies = [vacancy_parser.normalize_vacancy(vacancy, link, specialization_lookup)
+                 for vacancy, link in zip(raw_vacancies, raw_links)]
+    raw_dates = [vacancy.creation_time_raw for vacancy in vacancies] + \
+        [vacancy.publication_time_raw for vacancy in vacancies]
+    reference_time = datetime.now(timezone.utc)
+    vacancy_parser.apply_timestamps(vacancies, reference_time)
+    page_urls = [(page, f"{server.search_url}&page={page}") for page in range(len(pages))]
+    total_bytes = sum(len(page_content) for page_content in pages)
+
+    def fetch():
+        rate_limiter = vacancy_parser.RateLimiter(10_000, burst=fetch_workers)
+        with vacancy_parser.create_http_session(fetch_workers) as session:
+            for _, page_content, error in vacancy_parser.fetch_pages(page_urls, session, rate_limiter,
+                                                                      max_workers=fetch_workers):
+                if error is not None:
+                    raise error
+
+    def extract():
+        for page_content in pages:
+            vacancy_parser.extract_initial_state_json(page_content)
+
+    def decode():
+        for json_string in json_strings:
+            vacancy_parser.loads_json(json_string)
+
+    def normalize():
+        for vacancy, link in zip(raw_vacancies, raw_links):
+            vacancy_parser.normalize_vacancy(vacancy, link, specialization_lookup)
+
+    def format_dates_legacy():
+        for raw_date in raw_dates:
+            vacancy_parser.format_date_time_separate(raw_date)
+
+    def format_dates_batched():
+        vacancy_parser.apply_timestamps(vacancies, reference_time)
+        for start in range(0, len(vacancies), vacancy_parser.ITEMS_ON_PAGE):
+            vacancy_parser.format_export_batch(vacancies[start:start + vacancy_parser.ITEMS_ON_PAGE])
+
+    def startup():
+        # Снимок справочника в подменённом домашнем каталоге свежий, запуск не обращается к сети
+        prepare_home(work_dir, roles_body)
+        time_to_prompt(work_dir, server.roles_url)
+
+    def save_excel():
+        # save_to_excel пишет файл в текущий каталог
+        current_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            vacancy_parser.save_to_excel(vacancies)
+        finally:
+            os.chdir(current_dir)
+
+    return [
+        Stage("fetch", "стр", fetch, len(pages)),
+        Stage("extract_initial_state", "стр", extract, len(pages)),
+        Stage("json_loads", "МБ", decode, total_bytes),
+        Stage("normalize_vacancy", "вак", normalize, len(raw_vacancies)),
+        Stage("format_date_time_separate", "дат", format_dates_legacy, len(raw_dates)),
+        Stage("dates_batched", "вак", format_dates_batched, len(vacancies)),
+        Stage("save_to_excel", "строк", save_excel, len(vacancies)),
+        Stage("import_vacancy_parser", "запуск", lambda: run_python("import vacancy_parser"), 1),
+        Stage("startup_to_prompt", "запуск", startup, 1),
+    ]
+
+
+def measure(stage: Stage, repeat: int, min_seconds: float) -> dict:
+    # Время - лучший из repeat замеров без tracemalloc; быстрые стадии в каждом замере прокручиваются
+    # несколько раз, чтобы замер длился не меньше min_seconds. Пик памяти - отдельным прогоном под tracemalloc
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        stage.run()
+        loops = max(1, math.ceil(min_seconds / max(time.perf_counter() - started, 1e-9)))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(loops):
+                stage.run()
+            timings.append((time.perf_counter() - started) / loops)
+        tracemalloc.start()
+        stage.run()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    best = min(timings)
+    return {"seconds": best, "items": stage.items, "seconds_per_item": best / stage.items, "peak_bytes": peak_bytes}
+
+
+def format_throughput(stage: Stage, result: dict) -> str:
+    per_second = result["items"] / result["seconds"]
+    if stage.unit == "запуск":
+        return f"{result['seconds'] * 1000:10.0f} мс   "
+    if stage.unit == "МБ":
+        return f"{per_second / 2 ** 20:10.1f} МБ/с"
+    return f"{per_second:10.0f} {stage.unit}/с"
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        ratio = result["seconds_per_item"] / base["seconds_per_item"]
+        result["baseline_ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: в {ratio:.2f} раза медленнее базовой линии (допуск {1 + tolerance:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus")
+    parser.add_argument("--pages", type=int, default=10, help="число синтетических страниц, если корпуса нет")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="минимальная длительность одного замера")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fetch-workers", type=int, default=5)
+    parser.add_argument("--stages", help="через запятую; по умолчанию все")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--json", help="куда записать отчёт в JSON")
+    args = parser.parse_args()
+
+    vacancy_parser = load_parser_module()
+    pages, roles_body, source = load_corpus(args.corpus, args.pages)
+    server = start_replay_server(pages, roles_body, latency=args.latency_ms / 1000, error_rate=args.error_rate)
+    with contextlib.redirect_stdout(io.StringIO()):
+        roles = vacancy_parser.fetch_specializations_from_api(server.roles_url)
+    specialization_lookup = vacancy_parser.create_specialization_lookup_table(roles)
+    print(f"Корпус: {source}; задержка сервера {args.latency_ms:.0f} мс; повторов {args.repeat}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        stages = build_stages(vacancy_parser, server, pages, roles_body, specialization_lookup, args.fetch_workers,
+                              work_dir)
+        if args.stages:
+            selected = set(args.stages.split(","))
+            stages = [stage for stage in stages if stage.name in selected]
+        for stage in stages:
+            result = results[stage.name] = measure(stage, args.repeat, args.min_seconds)
+            print(f"{stage.name:28s} {result['seconds']:8.3f} с {format_throughput(stage, result)} "
+                  f"пик {result['peak_bytes'] / 2 ** 20:8.1f} МиБ")
+    server.shutdown()
+    server.server_close()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "corpus": source,
+        "stages": results,
+    }
+    exit_code = 0
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Базовая линия сохранена в {baseline_path}")
+    elif baseline_path.is_file():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for name, result in results.items():
+            if "baseline_ratio" in result:
+                print(f"{name:28s} x{result['baseline_ratio']:.2f} к базовой линии")
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression}")
+        exit_code = 1 if regressions else 0
+    else:
+        print(f"Базовая линия {baseline_path} не найдена; сохраните её флагом --save-baseline.")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
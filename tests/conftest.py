@@ -0,0 +1,33 @@
+# Общее для тестов: модуль парсера и локальный benchmarks/replay_server.py вместо hh.ru
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from _common import build_sample_page, build_sample_roles, load_parser_module  # noqa: E402
+from replay_server import start_replay_server  # noqa: E402
+
+vacancy_parser = load_parser_module()
+
+PAGES = 6
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**options):
+        pages = [build_sample_page(page, total_pages=PAGES) for page in range(PAGES)]
+        roles_body = json.dumps(build_sample_roles(), ensure_ascii=False).encode("utf-8")
+        server = start_replay_server(pages, roles_body, **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
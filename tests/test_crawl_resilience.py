@@ -0,0 +1,87 @@
+# Устойчивость обхода к сбоям: повторы, Retry-After, снижение темпа на 429/503 и продолжение
+# с контрольной точки. Страницы отдаёт локальный benchmarks/replay_server.py с внедрением ошибок.
+import asyncio
+import os
+
+import pytest
+from conftest import PAGES, vacancy_parser
+
+RETRY_AFTER = 1
+
+
+class RecordingRateLimiter(vacancy_parser.RateLimiter):
+    # Запоминает темп и паузу после каждого снижения темпа
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttles = []
+
+    def throttle(self, pause_seconds: float):
+        super().throttle(pause_seconds)
+        self.throttles.append((self.rate, pause_seconds))
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    # Экспоненциальная задержка повторов в тестах - миллисекунды вместо секунд
+    monkeypatch.setattr(vacancy_parser, "RETRY_BACKOFF_BASE", 0.01)
+
+
+def crawl(server, checkpoint_dir: str = None, rate_limiter=None) -> list:
+    return vacancy_parser.parse_hh_vacancies(server.search_url, PAGES, {}, max_workers=3,
+                                             rate_limiter=rate_limiter or RecordingRateLimiter(100, burst=3),
+                                             checkpoint_dir=checkpoint_dir)
+
+
+def crawl_async(server, rate_limiter) -> list:
+    async def collect():
+        return [vacancy async for vacancy in vacancy_parser.parse_hh_vacancies_async(
+            server.search_url, PAGES, {}, max_workers=3, rate_limiter=rate_limiter)]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("crawler", [crawl, crawl_async], ids=["sync", "async"])
+def test_every_page_returned_despite_injected_errors(start_server, crawler):
+    server = start_server(error_rate=0.3, retry_after=RETRY_AFTER, seed=3)
+    rate_limiter = RecordingRateLimiter(100, burst=3)
+
+    vacancies = crawler(server, rate_limiter=rate_limiter)
+
+    assert len(vacancies) == PAGES * vacancy_parser.ITEMS_ON_PAGE
+    assert len({vacancy.link for vacancy in vacancies}) == len(vacancies)
+    assert sum(count for status, count in server.status_counts.items() if status != 200) > 0
+
+
+def test_rate_drops_and_retry_after_is_honoured(start_server):
+    server = start_server(error_rate=0.3, retry_after=RETRY_AFTER, seed=3)
+    rate_limiter = RecordingRateLimiter(100, burst=3)
+
+    crawl(server, rate_limiter=rate_limiter)
+
+    # При seed=3 сервер отвечает и 429, и 503
+    assert server.status_counts.get(429) and server.status_counts.get(503)
+    assert len(rate_limiter.throttles) == server.status_counts[429] + server.status_counts[503]
+    assert all(rate < rate_limiter.max_rate for rate, _ in rate_limiter.throttles)
+    # Пауза после 429 берётся из Retry-After, после 503 без заголовка - из экспоненциальной задержки
+    assert sorted(pause for _, pause in rate_limiter.throttles)[-1] == RETRY_AFTER
+
+
+def test_failed_page_keeps_checkpoint_and_rerun_fetches_only_it(start_server, tmp_path):
+    dead_page = 2
+    server = start_server(dead_pages=(dead_page,), retry_after=RETRY_AFTER)
+    checkpoint_dir = str(tmp_path / "checkpoints")
+
+    first_run = crawl(server, checkpoint_dir)
+
+    assert len(first_run) == (PAGES - 1) * vacancy_parser.ITEMS_ON_PAGE
+    assert server.status_counts[500] == vacancy_parser.MAX_RETRIES + 1
+    assert len(os.listdir(checkpoint_dir)) == 1
+
+    server.dead_pages.clear()
+    server.request_count = 0
+    second_run = crawl(server, checkpoint_dir)
+
+    assert server.request_count == 1
+    assert len(second_run) == PAGES * vacancy_parser.ITEMS_ON_PAGE
+    assert [vacancy.number for vacancy in second_run] == list(range(1, len(second_run) + 1))
+    # Обход завершён полностью - контрольная точка больше не нужна
+    assert os.listdir(checkpoint_dir) == []
@@ -0,0 +1,111 @@
+# Инкрементальный режим: повторный прогон отдаёт только новые и изменённые вакансии
+import asyncio
+
+import pytest
+from conftest import PAGES, vacancy_parser
+
+
+class CollectingSink(vacancy_parser.VacancySink):
+    # Запоминает выгруженные вакансии вместо записи в файл; fail_on_batch - номер пачки, на которой запись падает
+    def __init__(self, fail_on_batch: int = None):
+        super().__init__(file_name="collected")
+        self.fail_on_batch = fail_on_batch
+        self.vacancies = []
+        self.batches = 0
+
+    def open(self):
+        pass
+
+    def write_rows(self, rows):
+        self.batches += 1
+        if self.batches == self.fail_on_batch:
+            raise OSError("Нет места на диске")
+        self.vacancies.extend(vacancy for vacancy, _ in rows)
+
+    def finish(self):
+        pass
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "index.sqlite3")
+
+
+def export(vacancies, index_path: str, sink: CollectingSink = None) -> list:
+    # Отдельный индекс на каждый прогон - как при новом запуске программы
+    sink = sink or CollectingSink()
+    vacancy_index = vacancy_parser.VacancyIndex(index_path)
+    try:
+        vacancy_parser.write_vacancies(vacancies(vacancy_index), [sink], vacancy_index=vacancy_index)
+    finally:
+        vacancy_index.close()
+    return sink.vacancies
+
+
+def crawl(server, vacancy_index):
+    return vacancy_parser.iter_hh_vacancies(server.search_url, PAGES, {}, max_workers=3, requests_per_second=100,
+                                            vacancy_index=vacancy_index)
+
+
+def crawl_async(server, vacancy_index) -> list:
+    async def collect():
+        return [vacancy async for vacancy in vacancy_parser.parse_hh_vacancies_async(
+            server.search_url, PAGES, {}, max_workers=3, requests_per_second=100, vacancy_index=vacancy_index)]
+    return asyncio.run(collect())
+
+
+def crawl_sharded(server, monkeypatch, shards: list):
+    # Разбиение подменяется готовым планом: сервер отдаёт одни и те же страницы на любой подзапрос
+    async def plan_search_shards_async(*args, **kwargs):
+        return [(f"{server.search_url}&{shard_query}", total) for shard_query, total in shards]
+
+    async def fetch_area_children_async(*args, **kwargs):
+        return {}
+
+    monkeypatch.setattr(vacancy_parser, "plan_search_shards_async", plan_search_shards_async)
+    monkeypatch.setattr(vacancy_parser, "fetch_area_children_async", fetch_area_children_async)
+
+    def vacancies(vacancy_index):
+        async def collect():
+            return [vacancy async for vacancy in vacancy_parser.parse_hh_vacancies_sharded_async(
+                server.search_url, vacancy_index=vacancy_index, max_workers=3, requests_per_second=100)]
+        return asyncio.run(collect())
+    return vacancies
+
+
+def test_index_is_keyed_by_search_not_by_shard_plan(start_server, index_path, monkeypatch):
+    server = start_server()
+
+    first_run = export(crawl_sharded(server, monkeypatch, [("area=1", PAGES * vacancy_parser.ITEMS_ON_PAGE)]),
+                       index_path)
+    # Выдача выросла, и запрос разбился иначе - вакансии те же
+    second_run = export(crawl_sharded(server, monkeypatch, [("area=2", 300), ("area=3", None)]), index_path)
+
+    assert len(first_run) == PAGES * vacancy_parser.ITEMS_ON_PAGE
+    assert second_run == []
+
+
+def test_vacancies_lost_by_failed_export_are_emitted_again(start_server, index_path):
+    server = start_server()
+    failing_sink = CollectingSink(fail_on_batch=2)
+
+    with pytest.raises(OSError):
+        export(lambda vacancy_index: crawl(server, vacancy_index), index_path, failing_sink)
+    rerun = export(lambda vacancy_index: crawl(server, vacancy_index), index_path)
+    third_run = export(lambda vacancy_index: crawl(server, vacancy_index), index_path)
+
+    assert len(failing_sink.vacancies) == vacancy_parser.ITEMS_ON_PAGE
+    assert len(rerun) == PAGES * vacancy_parser.ITEMS_ON_PAGE
+    assert third_run == []
+
+
+@pytest.mark.parametrize("crawler", [crawl, crawl_async], ids=["sync", "async"])
+def test_rerun_of_unchanged_search_fetches_only_first_page(start_server, index_path, crawler):
+    server = start_server()
+    export(lambda vacancy_index: crawler(server, vacancy_index), index_path)
+    server.request_count = 0
+
+    rerun = export(lambda vacancy_index: crawler(server, vacancy_index), index_path)
+
+    assert rerun == []
+    assert server.request_count == 1
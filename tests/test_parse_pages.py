@@ -0,0 +1,40 @@
+# Стадия разбора parse_pages с пулом процессов и без него
+import pytest
+from conftest import vacancy_parser
+from _common import build_sample_page
+
+
+@pytest.fixture(params=[False, True], ids=["inline", "pool"])
+def parse_pool(request):
+    if not request.param:
+        yield None
+        return
+    with vacancy_parser.create_parse_pool(1, {}) as pool:
+        yield pool
+
+
+def test_plain_iterator_is_accepted(parse_pool):
+    error = OSError("Страница не загружена")
+    fetched_pages = iter([(0, build_sample_page(0, total_pages=2), None), (1, None, error)])
+
+    parsed_pages = list(vacancy_parser.parse_pages(fetched_pages, {}, parse_pool))
+
+    assert [(page, len(vacancies or []), page_error) for page, vacancies, page_error in parsed_pages] == \
+        [(0, vacancy_parser.ITEMS_ON_PAGE, None), (1, 0, error)]
+
+
+def test_closing_stops_fetch_stage(parse_pool):
+    fetch_closed = []
+
+    def fetched_pages():
+        try:
+            for page in range(3):
+                yield page, build_sample_page(page, total_pages=3), None
+        finally:
+            fetch_closed.append(True)
+
+    parsed_pages = vacancy_parser.parse_pages(fetched_pages(), {}, parse_pool, read_ahead=1)
+    next(parsed_pages)
+    parsed_pages.close()
+
+    assert fetch_closed == [True]
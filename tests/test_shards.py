@@ -0,0 +1,117 @@
+# Разбиение больших выдач на подзапросы на синтетическом дереве регионов, без сети
+import logging
+from urllib.parse import parse_qs, urlparse
+
+from conftest import vacancy_parser
+
+BASE_URL = "https://hh.ru/search/vacancy?text=1c"
+LIMIT = vacancy_parser.MAX_SEARCH_RESULTS
+# Россия (113) делится на Москву (1) и Московскую область (2047), Беларусь (16) - лист
+AREA_CHILDREN = vacancy_parser.build_area_children([
+    {"id": "113", "areas": [{"id": "1", "areas": []}, {"id": "2047", "areas": []}]},
+    {"id": "16", "areas": []},
+])
+ALL_FILTERS = "&".join(f"{param}={values[0]}" for param, values in vacancy_parser.SHARD_FILTERS)
+
+
+def shard_values(urls: list[str], param: str) -> list[list[str]]:
+    return [parse_qs(urlparse(url).query).get(param) for url in urls]
+
+
+def test_area_tree_root_lists_top_level_areas():
+    assert AREA_CHILDREN[vacancy_parser.AREA_TREE_ROOT] == ["113", "16"]
+    assert AREA_CHILDREN["113"] == ["1", "2047"]
+    assert AREA_CHILDREN["16"] == []
+
+
+def test_query_without_area_is_split_by_top_level_areas():
+    shards = vacancy_parser.next_search_shards(BASE_URL, AREA_CHILDREN)
+
+    assert shard_values(shards, "area") == [["113"], ["16"]]
+    assert shard_values(shards, "text") == [["1c"], ["1c"]]
+
+
+def test_area_is_split_into_child_areas():
+    shards = vacancy_parser.next_search_shards(f"{BASE_URL}&area=113", AREA_CHILDREN)
+
+    assert shard_values(shards, "area") == [["1"], ["2047"]]
+
+
+def test_several_areas_are_split_into_one_per_shard():
+    shards = vacancy_parser.next_search_shards(f"{BASE_URL}&area=1&area=16", AREA_CHILDREN)
+
+    assert shard_values(shards, "area") == [["1"], ["16"]]
+
+
+def test_leaf_area_is_split_by_filters_in_order():
+    experience_shards = vacancy_parser.next_search_shards(f"{BASE_URL}&area=16", AREA_CHILDREN)
+    schedule_shards = vacancy_parser.next_search_shards(experience_shards[0], AREA_CHILDREN)
+
+    experience_values = dict(vacancy_parser.SHARD_FILTERS)["experience"]
+    assert shard_values(experience_shards, "experience") == [[value] for value in experience_values]
+    assert shard_values(experience_shards, "area") == [["16"]] * len(experience_values)
+    assert len(schedule_shards) == len(dict(vacancy_parser.SHARD_FILTERS)["schedule"])
+    assert all(values == ["noExperience"] for values in shard_values(schedule_shards, "experience"))
+
+
+def test_several_filter_values_are_split_before_new_filters():
+    shards = vacancy_parser.next_search_shards(f"{BASE_URL}&area=16&experience=between1And3&experience=moreThan6",
+                                               AREA_CHILDREN)
+
+    assert shard_values(shards, "experience") == [["between1And3"], ["moreThan6"]]
+    assert shard_values(shards, "schedule") == [None, None]
+
+
+def test_fully_narrowed_query_is_not_split():
+    assert vacancy_parser.next_search_shards(f"{BASE_URL}&area=16&{ALL_FILTERS}", AREA_CHILDREN) is None
+
+
+def test_split_oversized_shards(caplog):
+    unknown_url = f"{BASE_URL}&area=1"
+    empty_url = f"{BASE_URL}&area=2047"
+    small_url = f"{BASE_URL}&area=16"
+    oversized_url = f"{BASE_URL}&area=113"
+    unsplittable_url = f"{BASE_URL}&area=16&{ALL_FILTERS}"
+    urls = [unknown_url, empty_url, small_url, oversized_url, unsplittable_url]
+    totals = [None, 0, LIMIT, LIMIT + 1, LIMIT * 3]
+    shards = []
+
+    with caplog.at_level(logging.WARNING):
+        next_urls, splits = vacancy_parser._split_oversized_shards(urls, totals, AREA_CHILDREN, shards)
+
+    # Пустые подзапросы не обходятся, а размер выдачи остальных сохраняется для расчёта числа страниц
+    assert shards == [(unknown_url, None), (small_url, LIMIT), (unsplittable_url, LIMIT * 3)]
+    assert shard_values(next_urls, "area") == [["1"], ["2047"]]
+    assert splits == {oversized_url: (LIMIT + 1, next_urls)}
+    assert "не дробится дальше" in caplog.text and unsplittable_url in caplog.text
+
+
+def test_coverage_gap_is_reported(caplog):
+    parent_url = f"{BASE_URL}&area=113"
+    child_urls = vacancy_parser.next_search_shards(parent_url, AREA_CHILDREN)
+    splits = {parent_url: (10_000, child_urls)}
+
+    with caplog.at_level(logging.WARNING):
+        # Часть вакансий привязана к самой России, а не к её регионам
+        vacancy_parser.check_shard_coverage(splits, child_urls, [4000, 5000])
+
+    assert "9000 из 10000" in caplog.text
+
+
+def test_coverage_within_tolerance_or_unknown_is_not_reported(caplog):
+    parent_url = f"{BASE_URL}&area=113"
+    child_urls = vacancy_parser.next_search_shards(parent_url, AREA_CHILDREN)
+    splits = {parent_url: (10_000, child_urls)}
+
+    with caplog.at_level(logging.WARNING):
+        vacancy_parser.check_shard_coverage(splits, child_urls, [5000, 4950])
+        vacancy_parser.check_shard_coverage(splits, child_urls, [4000, None])
+
+    assert caplog.text == ""
+
+
+def test_shard_page_count_follows_planned_total():
+    assert vacancy_parser.shard_page_count(None) == vacancy_parser.MAX_PAGES
+    assert vacancy_parser.shard_page_count(1) == 1
+    assert vacancy_parser.shard_page_count(vacancy_parser.ITEMS_ON_PAGE + 1) == 2
+    assert vacancy_parser.shard_page_count(LIMIT * 3) == vacancy_parser.MAX_PAGES
@@ -0,0 +1,253 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_PREFIX = "hh_parser"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Последняя корзина - всё, что больше верхней границы (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # Оценка по корзинам: верхняя граница корзины, в которую попадает квантиль
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(upper_bound, self.max)
+        return self.max
+
+    def merge(self, state: dict):
+        if tuple(state["buckets"]) != self.buckets:
+            raise ValueError("Нельзя объединить гистограммы с разными корзинами.")
+        self.counts = [own + other for own, other in zip(self.counts, state["counts"])]
+        self.count += state["count"]
+        self.sum += state["sum"]
+        self.max = max(self.max, state["max"])
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 6),
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+        }
+
+
+# Реестр метрик прогона: счётчики и гистограммы задержек по стадиям (network, parse, normalize, export).
+# Потокобезопасен; по умолчанию используется общий экземпляр metrics
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.stages = {}
+        # Необязательное профилирование: стадии под cProfile и под tracemalloc
+        self.profiled_stages = set()
+        self.memory_stages = set()
+        self.profiles = {}
+        self.memory_peaks = {}
+        self._thread_state = threading.local()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        profiler = self._start_profile(stage) if stage in self.profiled_stages else None
+        memory_start = self._start_memory(stage) if stage in self.memory_stages else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+            if profiler is not None:
+                self._finish_profile(stage, profiler)
+            if memory_start is not None:
+                self._finish_memory(stage, memory_start)
+
+    def enable_profiling(self, stages: list[str] = None, memory_stages: list[str] = None):
+        # stages - стадии под cProfile, memory_stages - под tracemalloc (пик памяти внутри стадии)
+        self.profiled_stages = set(stages or ())
+        self.memory_stages = set(memory_stages or ())
+        if self.memory_stages and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _start_profile(self, stage: str) -> cProfile.Profile | None:
+        # Профилировщик в потоке может быть только один, вложенные стадии не профилируются
+        if getattr(self._thread_state, "profiling", False):
+            return None
+        self._thread_state.profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _finish_profile(self, stage: str, profiler: cProfile.Profile):
+        profiler.disable()
+        self._thread_state.profiling = False
+        with self._lock:
+            if stage in self.profiles:
+                self.profiles[stage].add(profiler)
+            else:
+                self.profiles[stage] = pstats.Stats(profiler)
+
+    def _start_memory(self, stage: str) -> int:
+        # При параллельных стадиях пик общий для процесса, поэтому значение приблизительное
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return current
+
+    def _finish_memory(self, stage: str, memory_start: int):
+        _, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self.memory_peaks[stage] = max(self.memory_peaks.get(stage, 0), peak - memory_start)
+
+    def pop_state(self) -> dict:
+        # Снимок для передачи из процесса пула в основной процесс (см. merge); реестр при этом очищается
+        with self._lock:
+            state = {"counters": self.counters,
+                     "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()}}
+            self.counters = {}
+            self.stages = {}
+        return state
+
+    def merge(self, state: dict):
+        with self._lock:
+            for name, value in state["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, histogram_state in state["stages"].items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram(histogram_state["buckets"])
+                histogram.merge(histogram_state)
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.stages = {}
+            self.profiles = {}
+            self.memory_peaks = {}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+                "memory_peak_bytes": dict(self.memory_peaks),
+            }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=2)
+
+    def write_profiles(self, directory: str) -> list[str]:
+        # Профили стадий в формате pstats: python -m pstats <файл> или snakeviz
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self._lock:
+            for stage, stats in self.profiles.items():
+                path = os.path.join(directory, f"{stage}.prof")
+                stats.dump_stats(path)
+                paths.append(path)
+        return paths
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        metric = f"{PROMETHEUS_PREFIX}_stage_seconds"
+        if snapshot["stages"]:
+            lines.append(f"# TYPE {metric} histogram")
+        for stage, histogram in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(histogram["buckets"] + ["+Inf"], histogram["counts"]):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{upper_bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {histogram["count"]}')
+
+        metric = f"{PROMETHEUS_PREFIX}_stage_memory_peak_bytes"
+        if snapshot["memory_peak_bytes"]:
+            lines.append(f"# TYPE {metric} gauge")
+        for stage, peak in sorted(snapshot["memory_peak_bytes"].items()):
+            lines.append(f'{metric}{{stage="{stage}"}} {peak}')
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self) -> list[str]:
+        snapshot = self.snapshot()
+        lines = [f"{name}: {value:g}" for name, value in sorted(snapshot["counters"].items())]
+        for stage, histogram in sorted(snapshot["stages"].items()):
+            lines.append(f"{stage}: {histogram['count']} замеров, всего {histogram['sum']:.2f} с, "
+                         f"p50 {histogram['p50'] * 1000:.1f} мс, p95 {histogram['p95'] * 1000:.1f} мс")
+        return lines
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.server.registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port: int, registry: Metrics = metrics, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    # Эндпоинт /metrics в формате Prometheus, работает в фоновом потоке до завершения процесса
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
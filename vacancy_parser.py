@@ -0,0 +1,2084 @@
+from __future__ import annotations
+
+import json
+import asyncio
+import csv
+import hashlib
+import html
+import importlib
+import importlib.util
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import zlib
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import re
+import itertools
+import warnings
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Iterator
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+import dataclasses
+from dataclasses import asdict, dataclass
+
+try:
+    import orjson
+    loads_json = orjson.loads
+except ImportError:
+    loads_json = json.loads
+
+from vacancy_metrics import metrics
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("vacancy_parser")
+
+
+# Модуль, который импортируется при первом обращении к его атрибуту. Тяжёлые библиотеки (pandas, openpyxl,
+# pyarrow, requests, httpx) нужны не в каждом прогоне и не сразу, а их импорт - основная часть времени запуска exe
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attribute: str):
+        value = getattr(importlib.import_module(self._name), attribute)
+        # Повторные обращения к атрибуту идут мимо __getattr__
+        setattr(self, attribute, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._name}>"
+
+
+def module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+requests = LazyModule("requests")
+requests_adapters = LazyModule("requests.adapters")
+httpx = LazyModule("httpx")
+bs4 = LazyModule("bs4")
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+futures_process = LazyModule("concurrent.futures.process")
+openpyxl = LazyModule("openpyxl")
+openpyxl_cell = LazyModule("openpyxl.cell")
+openpyxl_utils = LazyModule("openpyxl.utils")
+openpyxl_table = LazyModule("openpyxl.worksheet.table")
+openpyxl_styles = LazyModule("openpyxl.styles")
+# pyarrow нужен только для колоночной выгрузки (Parquet, Arrow IPC) и аналитики по истории
+# и может быть не установлен: наличие проверяется через module_available("pyarrow")
+pa = LazyModule("pyarrow")
+pc = LazyModule("pyarrow.compute")
+ds = LazyModule("pyarrow.dataset")
+pq = LazyModule("pyarrow.parquet")
+pafs = LazyModule("pyarrow.fs")
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+MAX_PAGES = 20
+ITEMS_ON_PAGE = 100
+# hh.ru отдаёт не больше MAX_PAGES страниц выдачи, всё сверх этого теряется без разбиения запроса
+MAX_SEARCH_RESULTS = MAX_PAGES * ITEMS_ON_PAGE
+
+
+# Token bucket на все потоки: в среднем не чаще requests_per_second запросов в секунду, всплеск до burst.
+# На 429/503 темп снижается вдвое и все запросы ставятся на паузу, после успешных ответов темп плавно восстанавливается
+class RateLimiter:
+    def __init__(self, requests_per_second: float, burst: int = 1, min_rate: float = 0.2):
+        self.max_rate = requests_per_second if requests_per_second and requests_per_second > 0 else 0.0
+        self.rate = self.max_rate
+        self.min_rate = min(min_rate, self.max_rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Забирает токен и возвращает, сколько секунд нужно подождать перед запросом
+        with self._lock:
+            now = time.monotonic()
+            pause = max(0.0, self._paused_until - now)
+            if not self.max_rate:
+                return pause
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, pause)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttle(self, pause_seconds: float):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_seconds)
+
+    def record_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    # Общая сессия держит keep-alive соединения, чтобы не делать TCP/TLS рукопожатие на каждую страницу
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    adapter = requests_adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".hh_vacancy_parser", "http_cache.sqlite3")
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+ROLES_CACHE_TTL = 3 * 24 * 3600  # справочник специализаций меняется редко
+SEARCH_PAGE_CACHE_TTL = 10 * 60  # выдача поиска быстро устаревает
+
+
+def normalize_url(url: str) -> str:
+    # Один и тот же ресурс должен давать один ключ кэша: регистр схемы/хоста, порядок параметров, якорь
+    parsed = urlparse(url)
+    netloc = parsed.netloc.lower()
+    if (parsed.scheme.lower(), parsed.port) in (("http", 80), ("https", 443)):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((parsed.scheme.lower(), netloc, parsed.path or "/", parsed.params, query, ""))
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+# Постоянный кэш HTTP-ответов в SQLite: тела сжаты zlib, при превышении размера
+# вытесняются давно не использованные записи (LRU)
+class HttpCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, url: str) -> CacheEntry | None:
+        key = normalize_url(url)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), key))
+        return CacheEntry(zlib.decompress(row[0]), row[1], row[2], row[3])
+
+    def store(self, url: str, body: bytes, etag: str = None, last_modified: str = None):
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, stored_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), compressed, etag, last_modified, now, now, len(compressed)))
+            self._evict()
+
+    def mark_revalidated(self, url: str):
+        # Сервер ответил 304 - запись снова свежая
+        now = time.time()
+        with self._lock:
+            self._connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?",
+                                     (now, now, normalize_url(url)))
+
+    def _evict(self):
+        total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        for url, size in self._connection.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total_size -= size
+            if total_size <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".hh_vacancy_parser", "vacancy_index.sqlite3")
+
+
+def vacancy_fingerprint(vacancy: "Vacancy") -> str:
+    # Отпечаток полей, изменение которых делает вакансию "изменённой" (отклики сравниваются отдельно)
+    key = repr((vacancy.title, vacancy.company, vacancy.city, vacancy.experience, vacancy.salary_from,
+                vacancy.salary_to, vacancy.publication_type, vacancy.has_hh_auction, vacancy.publication_time_raw,
+                vacancy.specialization))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# Постоянный индекс уже виденных вакансий для инкрементального режима: для каждого поиска хранит
+# последние отклики и отпечаток полей, а также журнал прироста откликов.
+# Изменения копятся в открытой транзакции и фиксируются через commit только после выгрузки
+# (см. write_vacancies): иначе не дошедшие до файлов вакансии следующий прогон счёл бы известными
+class VacancyIndex:
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS vacancies ("
+            "search_key TEXT NOT NULL, vacancy_link TEXT NOT NULL, responses INTEGER, fingerprint TEXT NOT NULL, "
+            "first_seen REAL NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (search_key, vacancy_link))")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses_log ("
+            "search_key TEXT NOT NULL, vacancy_link TEXT NOT NULL, seen_at REAL NOT NULL, "
+            "responses INTEGER, responses_delta INTEGER)")
+        self._connection.commit()
+
+    def update_page(self, search_key: str, vacancies: list["Vacancy"]) -> tuple[list["Vacancy"], int]:
+        # Возвращает новые и изменённые вакансии страницы и число известных неизменённых
+        now = time.time()
+        links = [vacancy.link for vacancy in vacancies if vacancy.link]
+        with self._lock:
+            known = {}
+            if links:
+                placeholders = ",".join("?" * len(links))
+                for link, responses, fingerprint in self._connection.execute(
+                        "SELECT vacancy_link, responses, fingerprint FROM vacancies "
+                        f"WHERE search_key = ? AND vacancy_link IN ({placeholders})", [search_key, *links]):
+                    known[link] = (responses, fingerprint)
+
+            fresh_vacancies = []
+            unchanged_count = 0
+            index_rows = []
+            log_rows = []
+            for vacancy in vacancies:
+                if not vacancy.link:
+                    fresh_vacancies.append(vacancy)
+                    continue
+                fingerprint = vacancy_fingerprint(vacancy)
+                previous = known.get(vacancy.link)
+                if previous is None:
+                    fresh_vacancies.append(vacancy)
+                    log_rows.append((search_key, vacancy.link, now, vacancy.responses, None))
+                elif previous == (vacancy.responses, fingerprint):
+                    unchanged_count += 1
+                else:
+                    previous_responses = previous[0]
+                    if vacancy.responses is not None and previous_responses is not None:
+                        vacancy.responses_delta = vacancy.responses - previous_responses
+                    fresh_vacancies.append(vacancy)
+                    if vacancy.responses != previous_responses:
+                        log_rows.append((search_key, vacancy.link, now, vacancy.responses, vacancy.responses_delta))
+                index_rows.append((search_key, vacancy.link, vacancy.responses, fingerprint, now, now))
+
+            self._connection.executemany(
+                "INSERT INTO vacancies (search_key, vacancy_link, responses, fingerprint, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (search_key, vacancy_link) DO UPDATE SET "
+                "responses = excluded.responses, fingerprint = excluded.fingerprint, last_seen = excluded.last_seen",
+                index_rows)
+            self._connection.executemany("INSERT INTO responses_log VALUES (?, ?, ?, ?, ?)", log_rows)
+        return fresh_vacancies, unchanged_count
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._connection.rollback()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 30.0
+MAX_RETRY_AFTER = 120.0
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Ответы, которыми hh.ru сигнализирует о слишком частых запросах
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    # Retry-After бывает числом секунд или HTTP-датой
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def backoff_delay(attempt: int) -> float:
+    # Экспоненциальная задержка с полным джиттером, чтобы повторы потоков не совпадали по времени
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_pause(response, attempt: int, rate_limiter: RateLimiter = None) -> float:
+    # Сколько ждать перед повтором запроса, ответ которого можно повторить
+    delay = retry_after_seconds(response.headers.get('Retry-After'))
+    if delay is None:
+        delay = backoff_delay(attempt)
+    if rate_limiter and response.status_code in THROTTLE_STATUS_CODES:
+        # Ограничение со стороны hh.ru касается всех потоков - пауза общая, через RateLimiter
+        rate_limiter.throttle(delay)
+        return 0.0
+    return delay
+
+
+def accept_response(page_url: str, response, cache_entry: CacheEntry = None, cache: HttpCache = None,
+                    rate_limiter: RateLimiter = None) -> bytes:
+    # Общая обработка итогового ответа requests/httpx: 304 из кэша, ошибки HTTP, сохранение в кэш
+    if response.status_code == 304 and cache_entry:
+        metrics.increment("cache_revalidated")
+        cache.mark_revalidated(page_url)
+        return cache_entry.body
+    if response.status_code >= 400:
+        metrics.increment("http_errors")
+    response.raise_for_status()
+    metrics.increment("bytes_downloaded", len(response.content))
+    if rate_limiter:
+        rate_limiter.record_success()
+    if cache:
+        cache.store(page_url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return response.content
+
+
+def fetch_page(session: requests.Session, page_url: str, rate_limiter: RateLimiter = None, timeout: int = 15,
+               cache: HttpCache = None, cache_ttl: float = SEARCH_PAGE_CACHE_TTL,
+               max_retries: int = MAX_RETRIES) -> bytes:
+    cache_entry = cache.get(page_url) if cache else None
+    if cache_entry and cache_entry.is_fresh(cache_ttl):
+        metrics.increment("cache_hits")
+        return cache_entry.body
+
+    request_headers = cache_entry.conditional_headers() if cache_entry else {}
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            rate_limiter.wait()
+        metrics.increment("http_requests")
+        try:
+            with metrics.time("network"):
+                response = session.get(page_url, headers=request_headers, timeout=timeout)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            metrics.increment("http_errors")
+            if attempt == max_retries:
+                raise
+            metrics.increment("http_retries")
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+            break
+        metrics.increment("http_errors")
+        metrics.increment("http_retries")
+        time.sleep(retry_pause(response, attempt, rate_limiter))
+
+    return accept_response(page_url, response, cache_entry, cache, rate_limiter)
+
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".hh_vacancy_parser", "checkpoints")
+# Восстановленные страницы несут отклики на момент первого прогона, поэтому контрольная точка
+# живёт не дольше нескольких сроков кэша выдачи, а не "до завтра"
+CHECKPOINT_MAX_AGE = 3 * SEARCH_PAGE_CACHE_TTL
+
+
+@dataclass(slots=True)
+class CheckpointPage:
+    vacancies: list
+    page_vacancy_count: int
+    unchanged_count: int
+    last: bool
+
+
+# Контрольная точка обхода одного поиска: обработанные страницы дописываются в JSON Lines,
+# прерванный обход продолжается с недостающих страниц вместо перезапуска
+class CrawlCheckpoint:
+    def __init__(self, search_key: str, directory: str = DEFAULT_CHECKPOINT_DIR, max_age: float = CHECKPOINT_MAX_AGE):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, hashlib.sha1(search_key.encode("utf-8")).hexdigest() + ".jsonl")
+        self.max_age = max_age
+
+    def load(self) -> dict[int, CheckpointPage]:
+        if not os.path.exists(self.path):
+            return {}
+        if time.time() - os.path.getmtime(self.path) > self.max_age:
+            self.remove()
+            return {}
+        pages = {}
+        with open(self.path, encoding="utf-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # строка, недописанная при аварийном завершении
+                pages[record["page"]] = CheckpointPage(
+                    [Vacancy(**fields) for fields in record["vacancies"]],
+                    record["page_vacancy_count"], record["unchanged_count"], record["last"])
+        return pages
+
+    def save_page(self, page: int, vacancies: list, page_vacancy_count: int, unchanged_count: int,
+                  last: bool = False):
+        record = {
+            "page": page,
+            "vacancies": [asdict(vacancy) for vacancy in vacancies],
+            "page_vacancy_count": page_vacancy_count,
+            "unchanged_count": unchanged_count,
+            "last": last,
+        }
+        with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+INITIAL_STATE_OPEN_TAG_RE = re.compile(rb'<template\b[^>]*\bid\s*=\s*["\']?HH-Lux-InitialState\b["\']?[^>]*>', re.IGNORECASE)
+HTML_ENTITY_RE = re.compile(rb'&(?:#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);')
+
+
+def find_initial_state_bytes(page_content: bytes) -> bytes | None:
+    # Ищем содержимое <template id="HH-Lux-InitialState"> прямо в байтах ответа, без построения DOM
+    open_tag = INITIAL_STATE_OPEN_TAG_RE.search(page_content)
+    if not open_tag:
+        return None
+    close_tag_start = page_content.find(b'</template>', open_tag.end())
+    if close_tag_start == -1:
+        return None
+    json_bytes = page_content[open_tag.end():close_tag_start]
+    if b'<' in json_bytes:
+        # Внутри шаблона есть разметка - такой случай разбирает только BeautifulSoup
+        return None
+    return json_bytes
+
+
+def extract_initial_state_json(page_content: bytes, encoding: str = 'utf-8') -> bytes | str | None:
+    # Возвращает JSON из HH-Lux-InitialState (None - тег не найден, пустое значение - тег пуст)
+    json_bytes = find_initial_state_bytes(page_content)
+    if json_bytes is not None:
+        if b'&' in json_bytes and HTML_ENTITY_RE.search(json_bytes):
+            return html.unescape(json_bytes.decode(encoding, errors='replace'))
+        return json_bytes.strip()
+
+    soup = bs4.BeautifulSoup(page_content.decode(encoding, errors='replace'), 'html.parser')
+    initial_state_tag = soup.find('template', id='HH-Lux-InitialState')
+    if not initial_state_tag:
+        return None
+    return initial_state_tag.string or ""
+
+
+# Компактная запись о вакансии: поля хранятся в слотах, русские названия столбцов
+# появляются только при выгрузке (см. EXPORT_COLUMNS)
+@dataclass(slots=True)
+class Vacancy:
+    number: int
+    city: str | None
+    title: str | None
+    experience: str | None
+    company: str | None
+    link: str | None
+    publication_type: str
+    has_hh_auction: bool
+    salary_from: int | None
+    salary_to: int | None
+    creation_time_raw: str | None
+    publication_time_raw: str | None
+    responses: int | None
+    specialization: str
+    # Заполняются пакетно в apply_timestamps: микросекунды UTC с начала эпохи
+    created_at: int | None = None
+    published_at: int | None = None
+    days_passed: float | str | None = None
+    # Прирост откликов с прошлого прогона (только в инкрементальном режиме)
+    responses_delta: int | None = None
+
+    def export_values(self, creation: tuple[str, str], publication: tuple[str, str]) -> list:
+        return [
+            self.number,
+            self.city,
+            self.title,
+            self.experience,
+            self.company,
+            self.link,
+            self.publication_type,
+            "Да" if self.has_hh_auction else "Нет",
+            self.salary_from,
+            self.salary_to,
+            creation[0],
+            creation[1],
+            publication[0],
+            publication[1],
+            self.responses,
+            self.specialization,
+            self.days_passed,
+        ]
+
+
+# Названия столбцов выгрузки в порядке Vacancy.export_values()
+EXPORT_COLUMNS = [
+    "№ ",
+    "Город",
+    "Вакансия",
+    "Опыт работы",
+    "Компания",
+    "Ссылка",
+    "Тип публикации",
+    "HH AUCTION (Топ поиска)",
+    "ЗП От",
+    "ЗП До",
+    "Дата создания",
+    "Время создания",
+    "Дата публикации",
+    "Время публикации",
+    "Отклики",  # Изменено с "О(общ)"
+    "Специализация",
+    "Дней Прошло",
+]
+
+
+def format_date_time_separate(iso_date_string):
+    if iso_date_string is None or iso_date_string == "Не найдено" or iso_date_string == "Автообновление не настроено":
+        return "", ""
+    try:
+        if '.' in iso_date_string:
+            iso_date_string = iso_date_string.split('.')[0]
+        if '+' in iso_date_string:
+            iso_date_string = iso_date_string.split('+')[0]
+        elif 'Z' in iso_date_string:
+            iso_date_string = iso_date_string.replace('Z', '')
+
+        dt_object = datetime.strptime(iso_date_string, "%Y-%m-%dT%H:%M:%S")
+        return dt_object.strftime("%d.%m.%Y"), dt_object.strftime("%H:%M")
+    except ValueError:
+        logger.warning(f"Предупреждение: Не удалось распарсить дату/время '{iso_date_string}'.")
+        return iso_date_string, ""
+
+MISSING_DATE_VALUES = (None, "", "Не найдено", "Автообновление не настроено")
+# hh.ru отдаёт время по Москве, в нём же показываем даты в отчёте
+DISPLAY_TIMEZONE = timezone(timedelta(hours=3))
+# NaT в datetime64[us] - минимальное значение int64, numpy для этого не импортируется
+NAT_MICROSECONDS = -2 ** 63
+MICROSECONDS_PER_DAY = 86400 * 1_000_000
+
+
+def parse_iso_timestamps(raw_values: list) -> np.ndarray:
+    # Векторный разбор ISO-меток ("2025-05-14T10:20:33.123+03:00", "+0300", "Z") в микросекунды UTC;
+    # пустые и неразобранные значения становятся NAT_MICROSECONDS
+    cleaned = pd.Series([None if value in MISSING_DATE_VALUES else value for value in raw_values], dtype=object)
+    parsed = pd.to_datetime(cleaned, utc=True, errors='coerce', format='ISO8601')
+    return pd.DatetimeIndex(parsed).as_unit('us').asi8
+
+
+def apply_timestamps(vacancies: list[Vacancy], reference_time: datetime):
+    # Разбирает даты пачки вакансий за один проход и считает "Дней Прошло" от одного опорного момента
+    if not vacancies:
+        return
+    created = parse_iso_timestamps([vacancy.creation_time_raw for vacancy in vacancies])
+    published = parse_iso_timestamps([vacancy.publication_time_raw for vacancy in vacancies])
+    reference_us = int(reference_time.timestamp() * 1_000_000)
+    days_passed = np.round((reference_us - created) / MICROSECONDS_PER_DAY, 2)
+
+    for vacancy, created_us, published_us, days in zip(vacancies, created.tolist(), published.tolist(),
+                                                         days_passed.tolist()):
+        if created_us != NAT_MICROSECONDS:
+            vacancy.created_at = created_us
+            vacancy.days_passed = days
+        elif vacancy.creation_time_raw not in MISSING_DATE_VALUES:
+            logger.warning(f"Предупреждение: Не удалось распарсить дату/время '{vacancy.creation_time_raw}'.")
+            vacancy.days_passed = "Ошибка даты/времени"
+        if published_us != NAT_MICROSECONDS:
+            vacancy.published_at = published_us
+
+
+def format_timestamps(instants: list, raw_values: list) -> list[tuple[str, str]]:
+    # Векторно превращает метки в пары ("дд.мм.ГГГГ", "ЧЧ:ММ"); неразобранная исходная строка идёт в дату как есть
+    values = np.array([NAT_MICROSECONDS if instant is None else instant for instant in instants], dtype=np.int64)
+    offset_us = int(DISPLAY_TIMEZONE.utcoffset(None).total_seconds() * 1_000_000)
+    local = np.where(values == NAT_MICROSECONDS, values, values + offset_us)
+    # datetime_as_string отдаёт "ГГГГ-ММ-ДДTЧЧ:ММ" сразу для всего массива
+    stamps = np.datetime_as_string(local.view('datetime64[us]').astype('datetime64[m]')).tolist()
+    formatted = []
+    for stamp, instant, raw in zip(stamps, instants, raw_values):
+        if instant is not None:
+            formatted.append((f"{stamp[8:10]}.{stamp[5:7]}.{stamp[0:4]}", stamp[11:16]))
+        elif raw in MISSING_DATE_VALUES:
+            formatted.append(("", ""))
+        else:
+            formatted.append((raw, ""))
+    return formatted
+
+
+def format_export_batch(batch: list[Vacancy]) -> list[tuple[Vacancy, list]]:
+    # Даты форматируются сразу для всей пачки, строки выгрузки - в порядке EXPORT_COLUMNS
+    creations = format_timestamps([v.created_at for v in batch], [v.creation_time_raw for v in batch])
+    publications = format_timestamps([v.published_at for v in batch], [v.publication_time_raw for v in batch])
+    return [(vacancy, vacancy.export_values(creation, publication))
+            for vacancy, creation, publication in zip(batch, creations, publications)]
+
+
+def fetch_specializations_from_api(api_url: str, cache: HttpCache = None) -> dict:
+    logger.info(f"Получение справочника специализаций с {api_url}...")
+    try:
+        with create_http_session(1) as session:
+            body = fetch_page(session, api_url, timeout=10, cache=cache, cache_ttl=ROLES_CACHE_TTL)
+        data = loads_json(body)
+        logger.info("Справочник специализаций успешно получен.")
+        return data
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка при получении справочника специализаций с API: {e}")
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка декодирования JSON при получении справочника специализаций: {e}")
+        return {}
+
+def create_specialization_lookup_table(json_data: dict) -> dict:
+    lookup_table = {}
+    if "categories" in json_data and isinstance(json_data["categories"], list):
+        for category in json_data["categories"]:
+            if "roles" in category and isinstance(category["roles"], list):
+                for role in category["roles"]:
+                    if "id" in role and "name" in role:
+                        lookup_table[str(role["id"])] = role["name"]
+    return lookup_table
+
+ROLES_API_URL = "https://api.hh.ru/professional_roles"
+# Снимок справочника, который поставляется вместе с программой (обновляется перед сборкой:
+# python "Vacancy Parser.py" --update-roles-snapshot), и копия пользователя, которую программа обновляет сама
+BUNDLED_ROLES_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "professional_roles.json")
+DEFAULT_ROLES_SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".hh_vacancy_parser", "professional_roles.json")
+ROLES_SNAPSHOT_MAX_AGE = 7 * 24 * 3600
+
+
+def read_roles_snapshot(path: str) -> dict:
+    try:
+        with open(path, "rb") as file:
+            return loads_json(file.read())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать снимок справочника специализаций {path}: {e}")
+        return {}
+
+
+def write_roles_snapshot(json_data: dict, path: str = DEFAULT_ROLES_SNAPSHOT_PATH):
+    # Запись через временный файл: прерванное обновление не портит прежний снимок
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(json_data, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def refresh_roles_snapshot(specialization_lookup: dict, api_url: str = ROLES_API_URL,
+                           path: str = DEFAULT_ROLES_SNAPSHOT_PATH) -> bool:
+    # Обычно работает в фоне, пока пользователь отвечает на вопросы, поэтому пишет в журнал только на уровне debug
+    try:
+        with create_http_session(1) as session:
+            json_data = loads_json(fetch_page(session, api_url, timeout=10, max_retries=1))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.debug(f"Не удалось обновить справочник специализаций с {api_url}: {e}")
+        return False
+    fresh_lookup = create_specialization_lookup_table(json_data)
+    if not fresh_lookup:
+        return False
+    write_roles_snapshot(json_data, path)
+    # Словарь дополняется на месте: стадии разбора в основном процессе уже держат ссылку на него.
+    # Пул процессов получает копию при создании, поэтому перед его созданием поток обновления дожидаются
+    specialization_lookup.update(fresh_lookup)
+    logger.debug(f"Справочник специализаций обновлён: {len(fresh_lookup)} ролей.")
+    return True
+
+
+def load_specialization_lookup(api_url: str = ROLES_API_URL, snapshot_path: str = DEFAULT_ROLES_SNAPSHOT_PATH,
+                               bundled_path: str = BUNDLED_ROLES_SNAPSHOT_PATH,
+                               max_age: float = ROLES_SNAPSHOT_MAX_AGE) -> tuple[dict, threading.Thread | None]:
+    # Справочник без ожидания сети: снимок пользователя, а если его нет - снимок из поставки.
+    # Устаревший снимок обновляется с API в фоновом потоке (он же возвращается, чтобы его можно было дождаться);
+    # запуск блокируется на запросе к API, только если снимков нет совсем
+    specialization_lookup = create_specialization_lookup_table(read_roles_snapshot(snapshot_path))
+    if specialization_lookup:
+        if time.time() - os.path.getmtime(snapshot_path) <= max_age:
+            return specialization_lookup, None
+    else:
+        specialization_lookup = create_specialization_lookup_table(read_roles_snapshot(bundled_path))
+
+    if not specialization_lookup:
+        logger.info(f"Получение справочника специализаций с {api_url}...")
+        refresh_roles_snapshot(specialization_lookup, api_url, snapshot_path)
+        return specialization_lookup, None
+    refresh_thread = threading.Thread(target=refresh_roles_snapshot, name="roles-refresh", daemon=True,
+                                      args=(specialization_lookup, api_url, snapshot_path))
+    refresh_thread.start()
+    return specialization_lookup, refresh_thread
+
+def with_items_on_page(base_url: str) -> str:
+    if not re.search(r"[?&]items_on_page=", base_url):
+        return base_url + f"&items_on_page={ITEMS_ON_PAGE}"
+    return re.sub(r"([?&])items_on_page=\d*", rf"\g<1>items_on_page={ITEMS_ON_PAGE}", base_url)
+
+
+def search_index_key(base_url: str) -> str:
+    # Ключ поиска в VacancyIndex
+    return normalize_url(with_items_on_page(base_url))
+
+
+def normalize_vacancy(vacancy: dict, vacancy_link: str | None, specialization_lookup: dict = None) -> Vacancy:
+    city = vacancy.get("area", {}).get("name")
+    job_title = vacancy.get("name")
+    company_name = vacancy.get("company", {}).get("name")
+
+    compencation_mode = vacancy.get("compensation", {}).get("mode")
+    compencation_currencyCode = vacancy.get("compensation", {}).get("currencyCode")
+    if compencation_mode == 'MONTH' and compencation_currencyCode == 'RUR':
+        compensation_from = vacancy.get("compensation", {}).get("from")
+        compensation_to = vacancy.get("compensation", {}).get("to")
+    else:
+        compensation_from = None
+        compensation_to = None
+
+    work_experience = vacancy.get("workExperience")
+
+    publication_type = "Неизвестно"
+    calculated_states = vacancy.get("vacancyProperties", {}).get("calculatedStates", {}).get("HH", {})
+    premium = calculated_states.get("premium", False)
+    standard = calculated_states.get("standard", False)
+    standard_plus = calculated_states.get("standardPlus", False)
+
+    if premium:
+        publication_type = "Премиум"
+    elif standard:
+        publication_type = "Стандарт"
+    elif standard_plus:
+        publication_type = "Плюс Стандарт"
+
+    creation_time_raw = vacancy.get("creationTime")
+
+    publication_date_obj = vacancy.get("publicationTime", {})
+    publication_date_raw = publication_date_obj.get("$") if publication_date_obj else None
+
+    total_responses_count = vacancy.get("totalResponsesCount")
+
+    has_hh_auction = False
+    vacancy_properties = vacancy.get("vacancyProperties", {})
+    if "properties" in vacancy_properties and isinstance(vacancy_properties["properties"], list):
+        for prop_group in vacancy_properties["properties"]:
+            if "property" in prop_group and isinstance(prop_group["property"], list):
+                if any(prop.get("propertyType") == "HH_AUCTION" for prop in prop_group["property"]):
+                    has_hh_auction = True
+                    break
+
+    professional_role_name = "Неизвестно"
+    if "professionalRoleIds" in vacancy and isinstance(vacancy["professionalRoleIds"], list) and \
+            len(vacancy["professionalRoleIds"]) > 0 and \
+            "professionalRoleId" in vacancy["professionalRoleIds"][0] and \
+            isinstance(vacancy["professionalRoleIds"][0]["professionalRoleId"], list) and \
+            len(vacancy["professionalRoleIds"][0]["professionalRoleId"]) > 0:
+        professional_role_id = str(vacancy["professionalRoleIds"][0]["professionalRoleId"][0])
+        if specialization_lookup and professional_role_id in specialization_lookup:
+            professional_role_name = specialization_lookup[professional_role_id]
+        else:
+            professional_role_name = f"ID: {professional_role_id}"
+
+    return Vacancy(
+        number=0,
+        city=city,
+        title=job_title,
+        experience=work_experience,
+        company=company_name,
+        link=vacancy_link,
+        publication_type=publication_type,
+        has_hh_auction=has_hh_auction,
+        salary_from=compensation_from,
+        salary_to=compensation_to,
+        creation_time_raw=creation_time_raw,
+        publication_time_raw=publication_date_raw,
+        responses=total_responses_count,
+        specialization=professional_role_name
+    )
+
+
+def extract_page_vacancies(page_content: bytes, current_page: int) -> list[dict] | None:
+    # Сырые вакансии страницы из HH-Lux-InitialState; None - страница не распознана
+    json_data_str = extract_initial_state_json(page_content)
+
+    if json_data_str is None:
+        logger.error(f"Ошибка: Тег <template id='HH-Lux-InitialState'> не найден на странице {current_page + 1}.")
+        return None
+
+    if not json_data_str:
+        logger.error(
+            f"Ошибка: JSON-строка внутри тега <template id='HH-Lux-InitialState'> пуста на странице {current_page + 1}.")
+        return None
+
+    data = loads_json(json_data_str)
+
+    current_page_vacancies = []
+    if "vacancySearchResult" in data and isinstance(data["vacancySearchResult"], dict):
+        if "vacancies" in data["vacancySearchResult"] and \
+                isinstance(data["vacancySearchResult"]["vacancies"], list):
+            current_page_vacancies = data["vacancySearchResult"]["vacancies"]
+        else:
+            logger.error(
+                f"В 'vacancySearchResult' не найден массив 'vacancies' или он имеет неверный формат на странице {current_page + 1}.")
+    else:
+        logger.error(
+            f"В JSON-данных не найден ключ 'vacancySearchResult' или он имеет неверный формат на странице {current_page + 1}.")
+    return current_page_vacancies
+
+
+def parse_page(page_content: bytes, current_page: int, specialization_lookup: dict = None) -> list[Vacancy] | None:
+    # CPU-ёмкая часть обработки страницы: извлечение JSON и нормализация всех вакансий; None - страница не распознана
+    with metrics.time("parse"):
+        raw_vacancies = extract_page_vacancies(page_content, current_page)
+    if raw_vacancies is None:
+        return None
+    page_vacancies = []
+    with metrics.time("normalize"):
+        for vacancy in raw_vacancies:
+            vacancy_id = vacancy.get("vacancyId")
+            vacancy_link = f"https://hh.ru/vacancy/{vacancy_id}" if vacancy_id else None
+            page_vacancies.append(normalize_vacancy(vacancy, vacancy_link, specialization_lookup))
+    return page_vacancies
+
+
+# Поля, которые заполняет normalize_vacancy; остальные вычисляются уже в основном процессе
+VACANCY_ROW_FIELDS = [name for name, field in Vacancy.__dataclass_fields__.items()
+                      if field.default is dataclasses.MISSING]
+DEFAULT_PARSE_WORKERS = max(0, min(4, (os.cpu_count() or 1) - 1))
+_worker_specialization_lookup = None
+
+
+def _init_parse_worker(specialization_lookup: dict):
+    global _worker_specialization_lookup
+    _worker_specialization_lookup = specialization_lookup
+    # При fork процесс наследует метрики родителя - их нельзя отправить обратно второй раз
+    metrics.reset()
+
+
+def create_parse_pool(workers: int = DEFAULT_PARSE_WORKERS, specialization_lookup: dict = None) -> ProcessPoolExecutor:
+    # Справочник специализаций передаётся в процессы один раз при запуске, а не с каждой страницей.
+    # Копия снимается сразу: при spawn аргументы сериализуются позже, и обновление справочника
+    # фоновым потоком в этот момент сломало бы сериализацию
+    return futures_process.ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_parse_worker,
+                               initargs=(dict(specialization_lookup or {}),))
+
+
+def parse_page_rows(page_content: bytes, current_page: int) -> tuple[list[tuple] | None, dict]:
+    # Выполняется в процессе пула: наружу уходят кортежи полей, они сериализуются на порядок дешевле объектов,
+    # и метрики разбора этой страницы
+    page_vacancies = parse_page(page_content, current_page, _worker_specialization_lookup)
+    rows = None
+    if page_vacancies is not None:
+        rows = [tuple(getattr(vacancy, name) for name in VACANCY_ROW_FIELDS) for vacancy in page_vacancies]
+    return rows, metrics.pop_state()
+
+
+def vacancies_from_rows(worker_result: tuple[list[tuple] | None, dict]) -> list[Vacancy] | None:
+    rows, worker_metrics = worker_result
+    metrics.merge(worker_metrics)
+    return None if rows is None else [Vacancy(*row) for row in rows]
+
+
+# Состояние обхода одного поиска: нумерация, дедупликация, инкрементальный индекс и контрольная точка.
+# Общее для синхронного и асинхронного обходчиков - они отличаются только способом загрузки страниц
+class SearchCrawl:
+    def __init__(self, base_url: str, max_pages: int, specialization_lookup: dict = None,
+                 vacancy_index: VacancyIndex = None, known_page_ratio: float = 0.9, checkpoint_dir: str = None,
+                 search_key: str = None):
+        self.base_url = with_items_on_page(base_url)
+        # Ключ инкрементального индекса. У подзапросов это ключ исходного запроса: разбиение зависит
+        # от текущего размера выдачи и между прогонами меняется, а известные вакансии - нет
+        self.search_key = search_key or search_index_key(self.base_url)
+        self.specialization_lookup = specialization_lookup
+        self.vacancy_index = vacancy_index
+        self.known_page_ratio = known_page_ratio
+        # Все вакансии прогона считаются от одного момента времени
+        self.reference_time = datetime.now(timezone.utc)
+        self.vacancy_counter = 0
+        self.seen_vacancy_links = set()
+        # Обход считается незавершённым, если какую-то страницу пришлось пропустить
+        self.complete = True
+
+        max_pages = MAX_PAGES if max_pages == 0 or max_pages > MAX_PAGES else max_pages
+        self.page_urls = [f"{self.base_url}&page={current_page}" for current_page in range(max_pages)]
+
+        # Контрольная точка, в отличие от индекса, хранит страницы именно этого (под)запроса
+        self.checkpoint = CrawlCheckpoint(normalize_url(self.base_url), checkpoint_dir) if checkpoint_dir else None
+        self.restored_pages = self.checkpoint.load() if self.checkpoint else {}
+        if self.restored_pages:
+            checkpoint_age = (time.time() - os.path.getmtime(self.checkpoint.path)) / 60
+            logger.warning(f"Найдена контрольная точка {checkpoint_age:.0f} мин. назад: обработано страниц - "
+                           f"{len(self.restored_pages)}. Продолжаем с места остановки, отклики этих страниц "
+                           f"взяты из прошлого прогона.")
+            # Страницы после уже найденного конца выдачи загружать незачем
+            last_page = min((page for page, restored_page in self.restored_pages.items() if restored_page.last),
+                            default=max_pages - 1)
+            self.page_urls = self.page_urls[:last_page + 1]
+
+    def page_windows(self) -> list[range]:
+        # Группы страниц, которые загружаются параллельно. Инкрементальный обход обычно останавливается
+        # на первой же странице, поэтому с индексом окно растёт постепенно (1, 2, 4... страниц):
+        # следующие страницы запрашиваются, только когда ясно, что обход продолжается
+        if self.vacancy_index is None:
+            return [range(len(self.page_urls))]
+        windows = []
+        start, size = 0, 1
+        while start < len(self.page_urls):
+            windows.append(range(start, min(start + size, len(self.page_urls))))
+            start += size
+            size *= 2
+        return windows
+
+    def pages_to_fetch(self, window: range) -> list[tuple[int, str]]:
+        return [(current_page, self.page_urls[current_page]) for current_page in window
+                if current_page not in self.restored_pages]
+
+    def restore_page(self, current_page: int) -> tuple[list[Vacancy], bool] | None:
+        restored_page = self.restored_pages.get(current_page)
+        if restored_page is None:
+            return None
+        for vacancy in restored_page.vacancies:
+            if vacancy.link:
+                self.seen_vacancy_links.add(vacancy.link)
+        metrics.increment("pages_restored")
+        self._number(restored_page.vacancies)
+        return restored_page.vacancies, restored_page.last
+
+    def accept_page(self, current_page: int, parsed_vacancies: list[Vacancy] | None) -> tuple[list[Vacancy], bool]:
+        # Принимает разобранную страницу (см. parse_page) строго по порядку страниц.
+        # Возвращает новые вакансии страницы и признак того, что обход пора остановить
+        metrics.increment("pages_processed")
+        if parsed_vacancies is None:
+            metrics.increment("page_errors")
+            self.complete = False
+            return [], True
+
+        if not parsed_vacancies:
+            logger.info(f"На странице {current_page + 1} вакансий не найдено. Завершение парсинга.")
+            if self.checkpoint:
+                self.checkpoint.save_page(current_page, [], 0, 0, last=True)
+            return [], True
+
+        page_vacancies = []
+        for vacancy in parsed_vacancies:
+            if vacancy.link and vacancy.link in self.seen_vacancy_links:
+                metrics.increment("duplicates")
+                logger.debug(f"Вакансия с ссылкой {vacancy.link} уже обработана, пропускаем.")
+                continue
+
+            if vacancy.link:
+                self.seen_vacancy_links.add(vacancy.link)
+
+            page_vacancies.append(vacancy)
+
+        page_vacancy_count = len(page_vacancies)
+        unchanged_count = 0
+        if self.vacancy_index is not None:
+            page_vacancies, unchanged_count = self.vacancy_index.update_page(self.search_key, page_vacancies)
+
+        self._number(page_vacancies)
+        with metrics.time("dates"):
+            apply_timestamps(page_vacancies, self.reference_time)
+        metrics.increment("vacancies_processed", len(page_vacancies))
+        metrics.increment("unchanged_vacancies", unchanged_count)
+
+        # В инкрементальном режиме дальше не идём, если страница почти целиком уже известна
+        incremental_stop = self.vacancy_index is not None and page_vacancy_count > 0 and \
+            unchanged_count / page_vacancy_count >= self.known_page_ratio
+        if self.checkpoint:
+            self.checkpoint.save_page(current_page, page_vacancies, page_vacancy_count, unchanged_count,
+                                      last=incremental_stop)
+        if incremental_stop:
+            logger.info(f"На странице {current_page + 1} {unchanged_count} из {page_vacancy_count} вакансий уже известны "
+                  f"и не изменились. Завершение инкрементального парсинга.")
+        return page_vacancies, incremental_stop
+
+    def page_failed(self, current_page: int, page_url: str, error: Exception):
+        metrics.increment("page_errors")
+        self.complete = False
+        if isinstance(error, (requests.exceptions.Timeout, httpx.TimeoutException)):
+            logger.error(f"Ошибка: Превышено время ожидания запроса для URL: {page_url} (повторы исчерпаны). Пропуск страницы.")
+        elif isinstance(error, (requests.exceptions.RequestException, httpx.HTTPError)):
+            logger.error(f"Ошибка при запросе к URL {page_url}: {error}. Пропуск страницы.")
+        elif isinstance(error, json.JSONDecodeError):
+            logger.error(f"Ошибка при декодировании JSON на странице {current_page + 1}: {error}. Пропуск страницы.")
+        else:
+            logger.error(f"Произошла непредвиденная ошибка на странице {current_page + 1}: {error}. Пропуск страницы.")
+
+    def finish(self):
+        if not self.checkpoint:
+            return
+        if self.complete:
+            self.checkpoint.remove()
+        else:
+            logger.warning(f"Часть страниц не обработана. Контрольная точка сохранена: повторный запуск "
+                           f"в течение {CHECKPOINT_MAX_AGE // 60} мин. догрузит только их.")
+
+    def _number(self, vacancies: list[Vacancy]):
+        for vacancy in vacancies:
+            self.vacancy_counter += 1
+            vacancy.number = self.vacancy_counter
+
+
+def fetch_pages(pages: list[tuple[int, str]], session: requests.Session, rate_limiter: RateLimiter = None,
+                cache: HttpCache = None, max_workers: int = 5) -> Iterator[tuple[int, bytes | None, Exception | None]]:
+    # Стадия загрузки: страницы скачиваются параллельно, а отдаются строго по порядку
+    # как (номер страницы, содержимое, ошибка). Закрытие генератора отменяет ещё не начатые загрузки
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    page_futures = [(current_page, executor.submit(fetch_page, session, page_url, rate_limiter, cache=cache))
+                    for current_page, page_url in pages]
+    try:
+        for current_page, page_future in page_futures:
+            try:
+                yield current_page, page_future.result(), None
+            except Exception as e:
+                yield current_page, None, e
+    finally:
+        for _, page_future in page_futures:
+            page_future.cancel()
+        executor.shutdown(wait=True)
+
+
+def parse_pages(fetched_pages: Iterator[tuple[int, bytes | None, Exception | None]], specialization_lookup: dict = None,
+                parse_pool: ProcessPoolExecutor = None,
+                read_ahead: int = 16) -> Iterator[tuple[int, list[Vacancy] | None, Exception | None]]:
+    # Стадия разбора: извлечение JSON и нормализация. С пулом процессов до read_ahead страниц
+    # разбираются параллельно, но отдаются в том же порядке, что и без пула.
+    # Закрытие генератора закрывает и стадию загрузки, если это генератор
+    def submit(page_content: bytes, current_page: int, error: Exception | None):
+        return None if error is not None else parse_pool.submit(parse_page_rows, page_content, current_page)
+
+    def result(current_page: int, parse_future, error: Exception | None):
+        if error is not None:
+            return current_page, None, error
+        try:
+            return current_page, vacancies_from_rows(parse_future.result()), None
+        except Exception as e:
+            return current_page, None, e
+
+    pending = deque()
+    try:
+        if parse_pool is None:
+            for current_page, page_content, error in fetched_pages:
+                if error is not None:
+                    yield current_page, None, error
+                    continue
+                try:
+                    yield current_page, parse_page(page_content, current_page, specialization_lookup), None
+                except Exception as e:
+                    yield current_page, None, e
+            return
+
+        for current_page, page_content, error in fetched_pages:
+            pending.append((current_page, submit(page_content, current_page, error), error))
+            # Готовые страницы из головы очереди отдаются сразу, не дожидаясь заполнения окна
+            while pending and (len(pending) >= read_ahead or pending[0][1] is None or pending[0][1].done()):
+                yield result(*pending.popleft())
+        while pending:
+            yield result(*pending.popleft())
+    finally:
+        for _, parse_future, _ in pending:
+            if parse_future is not None:
+                parse_future.cancel()
+        close = getattr(fetched_pages, "close", None)
+        if close is not None:
+            close()
+
+
+def iter_hh_vacancies(base_url: str, max_pages: int, specialization_lookup: dict = None,
+                      max_workers: int = 5, requests_per_second: float = 5.0,
+                      session: requests.Session = None, cache: HttpCache = None,
+                      vacancy_index: VacancyIndex = None, known_page_ratio: float = 0.9,
+                      rate_limiter: RateLimiter = None, checkpoint_dir: str = None,
+                      parse_pool: ProcessPoolExecutor = None, search_key: str = None) -> Iterator[Vacancy]:
+    # Потоковый обход поиска: вакансии отдаются по мере разбора страниц, весь результат в памяти не копится
+    crawl = SearchCrawl(base_url, max_pages, specialization_lookup, vacancy_index, known_page_ratio, checkpoint_dir,
+                        search_key)
+
+    own_session = session is None
+    if own_session:
+        session = create_http_session(max_workers)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second, burst=max_workers)
+
+    # Обработка идёт строго по порядку страниц, чтобы сохранить нумерацию,
+    # дедупликацию и остановку на первой пустой странице
+    stop = False
+    try:
+        for window in crawl.page_windows():
+            fetched_pages = fetch_pages(crawl.pages_to_fetch(window), session, rate_limiter, cache, max_workers)
+            parsed_pages = parse_pages(fetched_pages, crawl.specialization_lookup, parse_pool)
+            try:
+                for current_page in window:
+                    page_url = crawl.page_urls[current_page]
+                    restored = crawl.restore_page(current_page)
+                    if restored is not None:
+                        page_vacancies, stop = restored
+                    else:
+                        logger.debug(f"Загрузка страницы {current_page + 1}: {page_url}")
+                        _, parsed_vacancies, error = next(parsed_pages)
+                        try:
+                            if error is not None:
+                                raise error
+                            page_vacancies, stop = crawl.accept_page(current_page, parsed_vacancies)
+                        except Exception as e:
+                            crawl.page_failed(current_page, page_url, e)
+                            continue
+
+                    yield from page_vacancies
+                    if stop:
+                        break
+            finally:
+                parsed_pages.close()
+            if stop:
+                break
+    finally:
+        if own_session:
+            session.close()
+
+    crawl.finish()
+
+
+def parse_hh_vacancies(base_url: str, max_pages: int, specialization_lookup: dict = None,
+                       max_workers: int = 5, requests_per_second: float = 5.0,
+                       session: requests.Session = None, cache: HttpCache = None,
+                       vacancy_index: VacancyIndex = None, known_page_ratio: float = 0.9,
+                       rate_limiter: RateLimiter = None, checkpoint_dir: str = None,
+                       parse_pool: ProcessPoolExecutor = None, search_key: str = None) -> list[Vacancy]:
+    return list(iter_hh_vacancies(base_url, max_pages, specialization_lookup, max_workers, requests_per_second,
+                                  session, cache, vacancy_index, known_page_ratio, rate_limiter, checkpoint_dir,
+                                  parse_pool, search_key))
+
+
+AREAS_API_URL = "https://api.hh.ru/areas"
+# Фильтры, значения которых не пересекаются и вместе покрывают всю выдачу, в порядке применения
+SHARD_FILTERS = [
+    ("experience", ["noExperience", "between1And3", "between3And6", "moreThan6"]),
+    ("schedule", ["fullDay", "shift", "flexible", "remote", "flyInFlyOut"]),
+    ("employment", ["full", "part", "project", "volunteer", "probation"]),
+]
+# Ключ area_children со списком регионов верхнего уровня: с них дробится запрос без параметра area
+AREA_TREE_ROOT = ""
+# Доля выдачи, которую подзапросы одного разбиения могут не найти без предупреждения
+# (выдача успевает немного измениться между запросами)
+SHARD_COVERAGE_TOLERANCE = 0.01
+
+
+def build_area_children(areas: list) -> dict:
+    pending_areas = list(areas) if isinstance(areas, list) else []
+    area_children = {AREA_TREE_ROOT: [str(area.get("id")) for area in pending_areas]}
+    while pending_areas:
+        area = pending_areas.pop()
+        children = area.get("areas") or []
+        area_children[str(area.get("id"))] = [str(child.get("id")) for child in children]
+        pending_areas.extend(children)
+    return area_children
+
+
+def split_search_url(url: str, param: str, values: list[str]) -> list[str]:
+    # Заменяет все значения параметра param на одно значение из values - по URL на значение
+    parsed = urlparse(url)
+    query = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True) if key != param]
+    return [urlunparse(parsed._replace(query=urlencode(query + [(param, value)]))) for value in values]
+
+
+def next_search_shards(url: str, area_children: dict) -> list[str] | None:
+    # Дробит запрос по первому измерению, которое ещё можно сузить; None - дробить больше нечем
+    query = parse_qsl(urlparse(url).query, keep_blank_values=True)
+    areas = [value for key, value in query if key == "area"]
+    if len(areas) > 1:
+        return split_search_url(url, "area", areas)
+    if len(areas) == 1 and area_children.get(areas[0]):
+        return split_search_url(url, "area", area_children[areas[0]])
+    if not areas and area_children.get(AREA_TREE_ROOT):
+        return split_search_url(url, "area", area_children[AREA_TREE_ROOT])
+
+    used_params = {key for key, _ in query}
+    for param, values in SHARD_FILTERS:
+        present_values = [value for key, value in query if key == param]
+        if len(present_values) > 1:
+            return split_search_url(url, param, present_values)
+        if param not in used_params:
+            return split_search_url(url, param, values)
+    return None
+
+
+def search_total_from_page(page_content: bytes) -> int | None:
+    json_data_str = extract_initial_state_json(page_content)
+    if not json_data_str:
+        return None
+    search_result = loads_json(json_data_str).get("vacancySearchResult")
+    if not isinstance(search_result, dict):
+        return None
+    total_results = search_result.get("totalResults")
+    return total_results if isinstance(total_results, int) else None
+
+
+def _split_oversized_shards(urls: list[str], totals: list, area_children: dict,
+                            shards: list[tuple[str, int | None]]) -> tuple[list[str], dict]:
+    # Подзапросы, уложившиеся в лимит, уходят в shards; возвращает подзапросы следующего уровня
+    # и разбиения {URL запроса: (его размер выдачи, URL подзапросов)} для check_shard_coverage
+    next_urls = []
+    splits = {}
+    for url, total in zip(urls, totals):
+        if total is None or total <= MAX_SEARCH_RESULTS:
+            if total != 0:
+                shards.append((url, total))
+            continue
+        child_urls = next_search_shards(url, area_children)
+        if child_urls is None:
+            logger.warning(f"Предупреждение: подзапрос {url} находит {total} вакансий и не дробится дальше, "
+                  f"будут получены только первые {MAX_SEARCH_RESULTS}.")
+            shards.append((url, total))
+        else:
+            next_urls.extend(child_urls)
+            splits[url] = (total, child_urls)
+    return next_urls, splits
+
+
+def check_shard_coverage(splits: dict, urls: list[str], totals: list):
+    # Подзапросы одного разбиения вместе должны находить не меньше исходного запроса. Если меньше, часть
+    # выдачи ими не покрыта: например, вакансии привязаны к самому региону, а не к его дочерним регионам
+    totals_by_url = dict(zip(urls, totals))
+    for parent_url, (parent_total, child_urls) in splits.items():
+        child_totals = [totals_by_url.get(child_url) for child_url in child_urls]
+        if None in child_totals:
+            continue
+        missing = parent_total - sum(child_totals)
+        if missing > parent_total * SHARD_COVERAGE_TOLERANCE:
+            logger.warning(f"Предупреждение: подзапросы {parent_url} вместе находят {sum(child_totals)} "
+                           f"из {parent_total} вакансий, {missing} не попадут ни в один из них.")
+
+
+def shard_page_count(total: int | None) -> int:
+    # Сколько страниц обходить у подзапроса: размер выдачи уже известен из планирования,
+    # поэтому страницы за её концом не запрашиваются
+    if total is None:
+        return MAX_PAGES
+    return min(MAX_PAGES, max(1, math.ceil(total / ITEMS_ON_PAGE)))
+
+
+# Асинхронный API: много поисков на одном event loop с общим пулом соединений httpx
+
+
+def create_async_client(pool_size: int = 20, timeout: float = 15) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return httpx.AsyncClient(headers=REQUEST_HEADERS, limits=limits, timeout=timeout, follow_redirects=True)
+
+
+async def fetch_page_async(client: httpx.AsyncClient, page_url: str, rate_limiter: RateLimiter = None,
+                           timeout: float = 15, cache: HttpCache = None, cache_ttl: float = SEARCH_PAGE_CACHE_TTL,
+                           max_retries: int = MAX_RETRIES) -> bytes:
+    cache_entry = cache.get(page_url) if cache else None
+    if cache_entry and cache_entry.is_fresh(cache_ttl):
+        metrics.increment("cache_hits")
+        return cache_entry.body
+
+    request_headers = cache_entry.conditional_headers() if cache_entry else {}
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            delay = rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        metrics.increment("http_requests")
+        try:
+            with metrics.time("network"):
+                response = await client.get(page_url, headers=request_headers, timeout=timeout)
+        except httpx.TransportError:
+            metrics.increment("http_errors")
+            if attempt == max_retries:
+                raise
+            metrics.increment("http_retries")
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+            break
+        metrics.increment("http_errors")
+        metrics.increment("http_retries")
+        await asyncio.sleep(retry_pause(response, attempt, rate_limiter))
+
+    return accept_response(page_url, response, cache_entry, cache, rate_limiter)
+
+
+async def fetch_specializations_from_api_async(api_url: str, cache: HttpCache = None,
+                                               client: httpx.AsyncClient = None) -> dict:
+    logger.info(f"Получение справочника специализаций с {api_url}...")
+    own_client = client is None
+    if own_client:
+        client = create_async_client(1)
+    try:
+        data = loads_json(await fetch_page_async(client, api_url, timeout=10, cache=cache, cache_ttl=ROLES_CACHE_TTL))
+        logger.info("Справочник специализаций успешно получен.")
+        return data
+    except httpx.HTTPError as e:
+        logger.error(f"Ошибка при получении справочника специализаций с API: {e}")
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка декодирования JSON при получении справочника специализаций: {e}")
+        return {}
+    finally:
+        if own_client:
+            await client.aclose()
+
+
+async def parse_hh_vacancies_async(base_url: str, max_pages: int, specialization_lookup: dict = None,
+                                   max_workers: int = 5, requests_per_second: float = 5.0,
+                                   client: httpx.AsyncClient = None, cache: HttpCache = None,
+                                   vacancy_index: VacancyIndex = None, known_page_ratio: float = 0.9,
+                                   rate_limiter: RateLimiter = None, checkpoint_dir: str = None,
+                                   parse_pool: ProcessPoolExecutor = None,
+                                   search_key: str = None) -> AsyncIterator[Vacancy]:
+    # Асинхронный вариант parse_hh_vacancies: отдаёт вакансии по мере разбора страниц
+    crawl = SearchCrawl(base_url, max_pages, specialization_lookup, vacancy_index, known_page_ratio, checkpoint_dir,
+                        search_key)
+
+    own_client = client is None
+    if own_client:
+        client = create_async_client(max_workers)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second, burst=max_workers)
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def fetch_and_parse(current_page: int, page_url: str) -> list[Vacancy] | None:
+        async with semaphore:
+            page_content = await fetch_page_async(client, page_url, rate_limiter, cache=cache)
+        # Страница разбирается сразу после загрузки; с пулом процессов - параллельно с другими страницами
+        if parse_pool is None:
+            return parse_page(page_content, current_page, crawl.specialization_lookup)
+        loop = asyncio.get_running_loop()
+        return vacancies_from_rows(await loop.run_in_executor(parse_pool, parse_page_rows, page_content, current_page))
+
+    page_tasks = {}
+    stop = False
+    try:
+        for window in crawl.page_windows():
+            page_tasks = {current_page: asyncio.ensure_future(fetch_and_parse(current_page, page_url))
+                          for current_page, page_url in crawl.pages_to_fetch(window)}
+            for current_page in window:
+                page_url = crawl.page_urls[current_page]
+                restored = crawl.restore_page(current_page)
+                if restored is not None:
+                    page_vacancies, stop = restored
+                else:
+                    logger.debug(f"Загрузка страницы {current_page + 1}: {page_url}")
+                    try:
+                        page_vacancies, stop = crawl.accept_page(current_page, await page_tasks[current_page])
+                    except Exception as e:
+                        crawl.page_failed(current_page, page_url, e)
+                        continue
+
+                for vacancy in page_vacancies:
+                    yield vacancy
+                if stop:
+                    break
+            if stop:
+                break
+    finally:
+        for page_task in page_tasks.values():
+            page_task.cancel()
+        await asyncio.gather(*page_tasks.values(), return_exceptions=True)
+        if own_client:
+            await client.aclose()
+
+    crawl.finish()
+
+
+async def crawl_searches_async(search_urls: list[str | tuple[str, int]], max_pages: int = MAX_PAGES, specialization_lookup: dict = None,
+                               max_concurrent_searches: int = 10, max_workers: int = 5,
+                               requests_per_second: float = 5.0, client: httpx.AsyncClient = None,
+                               cache: HttpCache = None, vacancy_index: VacancyIndex = None,
+                               rate_limiter: RateLimiter = None, checkpoint_dir: str = None,
+                               parse_pool: ProcessPoolExecutor = None,
+                               search_key: str = None) -> AsyncIterator[tuple[str, Vacancy]]:
+    # Обходит несколько поисков одновременно и отдаёт пары (URL поиска, вакансия) по мере готовности.
+    # Вместо URL можно передать пару (URL, число страниц) - тогда max_pages для этого поиска не действует.
+    # search_key - общий ключ индекса для всех поисков, если это подзапросы одного запроса
+    own_client = client is None
+    if own_client:
+        client = create_async_client(max_concurrent_searches * max_workers)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second, burst=max_workers)
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_searches))
+    # Очередь ограничена страницей на каждый одновременный поиск: если приёмники не успевают,
+    # поиски ждут на put, и в памяти не копится больше этого
+    results = asyncio.Queue(maxsize=max(1, max_concurrent_searches) * ITEMS_ON_PAGE)
+    search_done = object()
+
+    async def run_search(search: str | tuple[str, int]):
+        search_url, search_pages = search if isinstance(search, tuple) else (search, max_pages)
+        try:
+            async with semaphore:
+                async for vacancy in parse_hh_vacancies_async(
+                        search_url, search_pages, specialization_lookup, max_workers=max_workers, client=client,
+                        cache=cache, vacancy_index=vacancy_index, rate_limiter=rate_limiter,
+                        checkpoint_dir=checkpoint_dir, parse_pool=parse_pool, search_key=search_key):
+                    await results.put((search_url, vacancy))
+        except Exception as e:
+            logger.error(f"Ошибка при обходе поиска {search_url}: {e}")
+        # При отмене (потребитель закрыл генератор) метка не нужна, и ждать места в очереди нельзя
+        await results.put(search_done)
+
+    search_tasks = [asyncio.ensure_future(run_search(search)) for search in search_urls]
+    try:
+        remaining_searches = len(search_tasks)
+        while remaining_searches:
+            item = await results.get()
+            if item is search_done:
+                remaining_searches -= 1
+                continue
+            yield item
+    finally:
+        for search_task in search_tasks:
+            search_task.cancel()
+        await asyncio.gather(*search_tasks, return_exceptions=True)
+        if own_client:
+            await client.aclose()
+
+
+async def fetch_area_children_async(api_url: str = AREAS_API_URL, cache: HttpCache = None,
+                                    client: httpx.AsyncClient = None) -> dict:
+    logger.info(f"Получение справочника регионов с {api_url}...")
+    own_client = client is None
+    if own_client:
+        client = create_async_client(1)
+    try:
+        areas = loads_json(await fetch_page_async(client, api_url, timeout=10, cache=cache, cache_ttl=ROLES_CACHE_TTL))
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        logger.warning(f"Ошибка при получении справочника регионов: {e}. Разбиение по регионам недоступно.")
+        return {}
+    finally:
+        if own_client:
+            await client.aclose()
+    return build_area_children(areas)
+
+
+async def plan_search_shards_async(base_url: str, client: httpx.AsyncClient, rate_limiter: RateLimiter = None,
+                                   cache: HttpCache = None,
+                                   area_children: dict = None) -> list[tuple[str, int | None]]:
+    area_children = area_children or {}
+
+    async def search_total(url: str) -> int | None:
+        try:
+            page_url = f"{with_items_on_page(url)}&page=0"
+            return search_total_from_page(await fetch_page_async(client, page_url, rate_limiter, cache=cache))
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            logger.warning(f"Ошибка при определении размера выдачи {url}: {e}. Подзапрос будет обойдён как есть.")
+            return None
+
+    shards = []
+    pending_urls = [base_url]
+    splits = {}
+    while pending_urls:
+        totals = await asyncio.gather(*(search_total(url) for url in pending_urls))
+        check_shard_coverage(splits, pending_urls, totals)
+        pending_urls, splits = _split_oversized_shards(pending_urls, totals, area_children, shards)
+    return shards
+
+
+async def parse_hh_vacancies_sharded_async(base_url: str, specialization_lookup: dict = None, max_workers: int = 5,
+                                           shard_workers: int = 4, requests_per_second: float = 5.0,
+                                           cache: HttpCache = None, vacancy_index: VacancyIndex = None,
+                                           checkpoint_dir: str = None,
+                                           parse_workers: int = 0) -> AsyncIterator[Vacancy]:
+    # Полный обход больших выдач: запрос дробится на подзапросы до 2000 вакансий, подзапросы
+    # обходятся параллельно на одном event loop, результат сливается с дедупликацией по ссылке
+    rate_limiter = RateLimiter(requests_per_second, burst=max_workers)
+    with create_parse_pool(parse_workers, specialization_lookup) if parse_workers > 0 else nullcontext() as parse_pool:
+        async with create_async_client(max_workers * shard_workers) as client:
+            area_children = await fetch_area_children_async(cache=cache, client=client)
+            shards = await plan_search_shards_async(base_url, client, rate_limiter, cache, area_children)
+            logger.info(f"Запрос разбит на подзапросов: {len(shards)}")
+
+            vacancy_counter = 0
+            seen_vacancy_links = set()
+            async for _, vacancy in crawl_searches_async(
+                    [(shard_url, shard_page_count(shard_total)) for shard_url, shard_total in shards],
+                    MAX_PAGES, specialization_lookup, max_concurrent_searches=shard_workers,
+                    max_workers=max_workers, client=client, cache=cache, vacancy_index=vacancy_index,
+                    rate_limiter=rate_limiter, checkpoint_dir=checkpoint_dir, parse_pool=parse_pool,
+                    search_key=search_index_key(base_url)):
+                if vacancy.link:
+                    if vacancy.link in seen_vacancy_links:
+                        continue
+                    seen_vacancy_links.add(vacancy.link)
+                vacancy_counter += 1
+                vacancy.number = vacancy_counter
+                yield vacancy
+
+
+def parse_hh_vacancies_sharded(base_url: str, specialization_lookup: dict = None, max_workers: int = 5,
+                               shard_workers: int = 4, requests_per_second: float = 5.0,
+                               cache: HttpCache = None, vacancy_index: VacancyIndex = None,
+                               checkpoint_dir: str = None, parse_workers: int = 0) -> list[Vacancy]:
+    # Синхронная обёртка над parse_hh_vacancies_sharded_async для кода без event loop
+    async def collect() -> list[Vacancy]:
+        return [vacancy async for vacancy in parse_hh_vacancies_sharded_async(
+            base_url, specialization_lookup, max_workers, shard_workers, requests_per_second, cache,
+            vacancy_index, checkpoint_dir, parse_workers)]
+    return asyncio.run(collect())
+
+
+EXCEL_COLUMN_WIDTHS_PIXELS = {
+    "№ ": 40,
+    "Город": 128,
+    "Вакансия": 263,
+    "Опыт работы": 133,
+    "Компания": 143,
+    "Ссылка": 65,
+    "Тип публикации": 125,
+    "HH AUCTION (Топ поиска)": 83,
+    "ЗП От": 70,
+    "ЗП До": 70,
+    "Дата создания": 100,
+    "Время создания": 60,
+    "Дата публикации": 100,
+    "Время публикации": 60,
+    "Отклики": 60,
+    "Специализация": 220,
+    "Дней Прошло": 70,
+    "Откликов в день (среднее)": 70,
+    "Прирост откликов": 70
+}
+HIGHLIGHTED_COMPANY = "Компания Апогей (Техподдержка 1С)"
+RESPONSES_PER_DAY_COLUMN = "Откликов в день (среднее)"
+RESPONSES_DELTA_COLUMN = "Прирост откликов"
+
+
+def export_file_name(city: str | None, extension: str, created_at: str) -> str:
+    safe_city = re.sub(r'[\\/:*?"<>|]', '_', city) if city else None
+    return f"{safe_city or 'НеизвестныйГород'}_{created_at}{extension}"
+
+
+def responses_per_day(vacancy: Vacancy) -> float | str:
+    # То же, что формула Excel IFERROR(ROUND(Отклики/Дней Прошло, 2), "")
+    try:
+        return round(vacancy.responses / vacancy.days_passed, 2)
+    except (TypeError, ZeroDivisionError):
+        return ""
+
+
+# Потоковый приёмник выгрузки: пачки строк приходят по мере разбора страниц.
+# Файл создаётся при первой пачке (имя по умолчанию - по городу первой вакансии) и дописывается после каждой.
+# Формат задают open, write_rows и finish
+class VacancySink(ABC):
+    extension = ""
+
+    def __init__(self, file_name: str = None, with_responses_delta: bool = False):
+        self.file_name = file_name
+        self.with_responses_delta = with_responses_delta
+        self.headers = EXPORT_COLUMNS + ([RESPONSES_DELTA_COLUMN] if with_responses_delta else []) + \
+            [RESPONSES_PER_DAY_COLUMN]
+        self.rows_written = 0
+        self.created_at = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+    def write_batch(self, rows: list[tuple[Vacancy, list]]):
+        if not rows:
+            return
+        if self.rows_written == 0:
+            if self.file_name is None:
+                first_city = next((vacancy.city for vacancy, _ in rows if vacancy.city), None)
+                self.file_name = export_file_name(first_city, self.extension, self.created_at)
+            self.open()
+        with metrics.time("export"):
+            self.write_rows(rows)
+        self.rows_written += len(rows)
+
+    def table_values(self, vacancy: Vacancy, values: list) -> list:
+        # Строка общая для всех приёмников, поэтому каждый дополняет свою копию
+        return values + [vacancy.responses_delta] if self.with_responses_delta else list(values)
+
+    def close(self):
+        if self.rows_written == 0:
+            return
+        with metrics.time("export"):
+            self.finish()
+        logger.info(f"\nДанные успешно сохранены в файл: {self.file_name}")
+
+    @abstractmethod
+    def open(self):
+        ...
+
+    @abstractmethod
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        ...
+
+    @abstractmethod
+    def finish(self):
+        ...
+
+
+class ExcelSink(VacancySink):
+    extension = ".xlsx"
+
+    def open(self):
+        # Книга пишется за один проход в режиме write-only: строки сразу уходят во временный файл,
+        # ссылки, формула, подсветка и таблица задаются при записи, без повторной загрузки файла
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet()
+
+        # Установка ширины столбцов в пикселях (переводим в единицы openpyxl: 1 единица = 9 пикселей)
+        for idx, header in enumerate(self.headers, 1):
+            if header in EXCEL_COLUMN_WIDTHS_PIXELS:
+                self.worksheet.column_dimensions[openpyxl_utils.get_column_letter(idx)].width = EXCEL_COLUMN_WIDTHS_PIXELS[header] / 9
+
+        # Установка переноса текста для заголовков
+        header_cells = []
+        for header in self.headers:
+            cell = openpyxl_cell.WriteOnlyCell(self.worksheet, value=header)
+            cell.alignment = openpyxl_styles.Alignment(wrapText=True)
+            header_cells.append(cell)
+        self.worksheet.append(header_cells)
+
+        # Столбцы для формулы "Откликов в день (среднее)" и кликабельных ссылок
+        self.total_responses_col = openpyxl_utils.get_column_letter(EXPORT_COLUMNS.index("Отклики") + 1)
+        self.days_passed_col = openpyxl_utils.get_column_letter(EXPORT_COLUMNS.index("Дней Прошло") + 1)
+        self.link_idx = EXPORT_COLUMNS.index("Ссылка")
+        self.fill = openpyxl_styles.PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # RGB(146, 208, 80)
+        self.row_number = 1
+
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        ws = self.worksheet
+        for vacancy, values in rows:
+            self.row_number += 1
+            values = self.table_values(vacancy, values)
+
+            # Формула для "Откликов в день (среднее)"
+            values.append(f'=IFERROR(ROUND({self.total_responses_col}{self.row_number}/'
+                          f'{self.days_passed_col}{self.row_number},2),"")')
+
+            # Делаем ссылки кликабельными
+            link = vacancy.link
+            if link and isinstance(link, str) and link.startswith('http'):
+                cell = openpyxl_cell.WriteOnlyCell(ws, value=link)
+                cell.hyperlink = link
+                cell.style = 'Hyperlink'
+                values[self.link_idx] = cell
+
+            # Подсветка строк для компании "Компания Апогей (Техподдержка 1С)"
+            if vacancy.company == HIGHLIGHTED_COMPANY:
+                for idx, value in enumerate(values):
+                    cell = value if isinstance(value, openpyxl_cell.Cell) else openpyxl_cell.WriteOnlyCell(ws, value=value)
+                    cell.fill = self.fill
+                    values[idx] = cell
+
+            ws.append(values)
+
+    def finish(self):
+        # Создаём таблицу Excel
+        tab = openpyxl_table.Table(displayName="VacancyTable", ref=f"A1:{openpyxl_utils.get_column_letter(len(self.headers))}{self.row_number}")
+        tab.tableColumns = [openpyxl_table.TableColumn(id=idx, name=header) for idx, header in enumerate(self.headers, 1)]
+        style = openpyxl_table.TableStyleInfo(
+            name="TableStyleMedium2",
+            showFirstColumn=False,
+            showLastColumn=False,
+            showRowStripes=True,
+            showColumnStripes=False
+        )
+        tab.tableStyleInfo = style
+        with warnings.catch_warnings():
+            # Столбцы таблицы уже заданы выше, предупреждение write-only режима здесь не относится к делу
+            warnings.filterwarnings("ignore", message="In write-only mode you must add table columns manually")
+            self.worksheet.add_table(tab)
+        self.workbook.save(self.file_name)
+
+
+class CsvSink(VacancySink):
+    # Те же столбцы, что и в Excel; utf-8 с BOM, чтобы Excel сразу открывал кириллицу.
+    # Файл сбрасывается на диск после каждой пачки, его можно читать по мере записи
+    extension = ".csv"
+
+    def open(self):
+        self.file = open(self.file_name, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.headers)
+
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        self.writer.writerows(self.table_values(vacancy, values) + [responses_per_day(vacancy)]
+                              for vacancy, values in rows)
+        self.file.flush()
+
+    def finish(self):
+        self.file.close()
+
+
+class JsonLinesSink(VacancySink):
+    # Одна вакансия - одна JSON-строка с полями Vacancy; удобно для tail -f и потоковых утилит
+    extension = ".jsonl"
+
+    def open(self):
+        self.file = open(self.file_name, "w", encoding="utf-8")
+
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        for vacancy, _ in rows:
+            record = asdict(vacancy)
+            # "" означает, что метрику посчитать нельзя; настоящий 0.0 остаётся числом
+            per_day = responses_per_day(vacancy)
+            record["responses_per_day"] = per_day if per_day != "" else None
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def finish(self):
+        self.file.close()
+
+
+def vacancy_arrow_schema() -> "pa.Schema":
+    # Типизированная схема полей Vacancy; метки времени - микросекунды UTC, как в created_at/published_at
+    timestamp = pa.timestamp("us", tz="UTC")
+    return pa.schema([
+        ("number", pa.int64()),
+        ("city", pa.string()),
+        ("title", pa.string()),
+        ("experience", pa.string()),
+        ("company", pa.string()),
+        ("link", pa.string()),
+        ("publication_type", pa.string()),
+        ("has_hh_auction", pa.bool_()),
+        ("salary_from", pa.int64()),
+        ("salary_to", pa.int64()),
+        ("creation_time_raw", pa.string()),
+        ("publication_time_raw", pa.string()),
+        ("responses", pa.int64()),
+        ("specialization", pa.string()),
+        ("created_at", timestamp),
+        ("published_at", timestamp),
+        ("days_passed", pa.float64()),
+        ("responses_delta", pa.int64()),
+    ])
+
+
+def vacancies_to_arrow(vacancies: list[Vacancy], schema: "pa.Schema", snapshot_at: datetime = None) -> "pa.Table":
+    # Столбцы строятся только для полей схемы, так что схема может быть подмножеством полей Vacancy
+    columns = {name: [getattr(vacancy, name) for vacancy in vacancies] for name in schema.names
+               if name not in ("days_passed", "snapshot_at")}
+    # "Дней Прошло" может содержать текст ошибки даты - в числовом столбце это пропуск
+    columns["days_passed"] = [vacancy.days_passed if isinstance(vacancy.days_passed, float) else None
+                              for vacancy in vacancies]
+    if "snapshot_at" in schema.names:
+        columns["snapshot_at"] = [snapshot_at] * len(vacancies)
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def with_responses_per_day(table: "pa.Table") -> "pa.Table":
+    # Векторный аналог формулы Excel IFERROR(ROUND(Отклики/Дней Прошло, 2), ""):
+    # деление на ноль и пропуски дают null
+    days_passed = table["days_passed"]
+    days_passed = pc.if_else(pc.equal(days_passed, 0), pa.scalar(None, pa.float64()), days_passed)
+    per_day = pc.round(pc.divide(pc.cast(table["responses"], pa.float64()), days_passed), 2,
+                       round_mode="half_towards_infinity")
+    return table.append_column("responses_per_day", per_day)
+
+
+class ParquetSink(VacancySink):
+    # Строки копятся до row_group_size и уходят в файл отдельными группами строк,
+    # поэтому в памяти никогда не лежит больше одной группы
+    extension = ".parquet"
+
+    def __init__(self, file_name: str = None, with_responses_delta: bool = False, row_group_size: int = 10_000):
+        if not module_available("pyarrow"):
+            raise ImportError("Для выгрузки в Parquet нужен пакет pyarrow (pip install pyarrow).")
+        super().__init__(file_name, with_responses_delta)
+        self.row_group_size = row_group_size
+        self.schema = vacancy_arrow_schema().append(pa.field("snapshot_at", pa.timestamp("us", tz="UTC")))
+        self.snapshot_at = datetime.now(timezone.utc)
+        self.pending = []
+
+    def open(self):
+        file_schema = self.schema.append(pa.field("responses_per_day", pa.float64()))
+        self.writer = pq.ParquetWriter(self.file_name, file_schema, compression="zstd")
+
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        self.pending.extend(vacancy for vacancy, _ in rows)
+        if len(self.pending) >= self.row_group_size:
+            self._flush()
+
+    def finish(self):
+        self._flush()
+        self.writer.close()
+
+    def _flush(self):
+        if self.pending:
+            self.writer.write_table(with_responses_per_day(vacancies_to_arrow(self.pending, self.schema,
+                                                                              self.snapshot_at)))
+            self.pending = []
+
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".hh_vacancy_parser", "history")
+# Значение, которым hive-разбиение обозначает пустой ключ
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+HISTORY_PATH_UNSAFE_RE = re.compile(r'[%/\\:*?"<>|=\x00-\x1f]')
+
+
+def history_dataset_path(file_format: str = "parquet", root: str = DEFAULT_HISTORY_DIR) -> str:
+    # Parquet и Arrow IPC лежат в разных каталогах: набор данных читается одним форматом
+    return os.path.join(root, file_format)
+
+
+def history_partition_value(value: str | None) -> str:
+    # Значение ключа в имени каталога; недопустимые в путях символы кодируются как %XX,
+    # что hive-разбиение pyarrow декодирует обратно при чтении
+    if not value:
+        return HIVE_NULL_PARTITION
+    return HISTORY_PATH_UNSAFE_RE.sub(lambda match: f"%{ord(match.group()):02X}", value)
+
+
+def history_partitioning() -> "ds.Partitioning":
+    return ds.partitioning(pa.schema([("snapshot_date", pa.string()), ("city", pa.string())]), flavor="hive")
+
+
+def history_file_schema() -> "pa.Schema":
+    # Город и дата снимка хранятся в путях разделов, а не в файлах
+    schema = vacancy_arrow_schema()
+    schema = schema.remove(schema.get_field_index("city"))
+    return schema.append(pa.field("snapshot_at", pa.timestamp("us", tz="UTC")))
+
+
+# Накопительный набор данных истории откликов: каждый прогон дописывает новые файлы
+# в разделы snapshot_date=ГГГГ-ММ-ДД/city=Город, уже записанные файлы не меняются
+class HistoryDatasetSink(VacancySink):
+    file_format = "parquet"
+
+    def __init__(self, file_name: str = None, with_responses_delta: bool = False, row_group_size: int = 50_000,
+                 max_pending_rows: int = 200_000, max_open_writers: int = 32):
+        if not module_available("pyarrow"):
+            raise ImportError("Для набора данных истории нужен пакет pyarrow (pip install pyarrow).")
+        super().__init__(file_name or history_dataset_path(self.file_format), with_responses_delta)
+        self.row_group_size = row_group_size
+        # При обходе сотен городов строки и файлы копятся по каждому из них, поэтому общий объём
+        # накопленных строк и число одновременно открытых файлов ограничены отдельно
+        self.max_pending_rows = max_pending_rows
+        self.max_open_writers = max(1, max_open_writers)
+        self.schema = history_file_schema()
+        self.snapshot_at = datetime.now(timezone.utc)
+        self.snapshot_date = self.snapshot_at.astimezone(DISPLAY_TIMEZONE).strftime("%Y-%m-%d")
+        self.run_id = f"{self.snapshot_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        # Открытые файлы по городам в порядке последней записи, накопленные строки и число файлов города
+        self.writers = OrderedDict()
+        self.pending = {}
+        self.pending_rows = 0
+        self.part_counts = {}
+
+    def open(self):
+        os.makedirs(self.file_name, exist_ok=True)
+
+    def close(self):
+        if self.rows_written == 0:
+            return
+        with metrics.time("export"):
+            self.finish()
+        logger.info(f"\nСнимок добавлен в набор данных истории: {self.file_name}")
+
+    def write_rows(self, rows: list[tuple[Vacancy, list]]):
+        for vacancy, _ in rows:
+            city_rows = self.pending.setdefault(vacancy.city, [])
+            city_rows.append(vacancy)
+            self.pending_rows += 1
+            if len(city_rows) >= self.row_group_size:
+                self._flush(vacancy.city)
+            elif self.pending_rows > self.max_pending_rows:
+                self._flush(max(self.pending, key=lambda city: len(self.pending[city])))
+
+    def finish(self):
+        for city in list(self.pending):
+            self._flush(city)
+        for writer in self.writers.values():
+            writer.close()
+
+    def _flush(self, city: str | None):
+        vacancies = self.pending.pop(city, None)
+        if not vacancies:
+            return
+        self.pending_rows -= len(vacancies)
+        writer = self.writers.pop(city, None)
+        if writer is None:
+            if len(self.writers) >= self.max_open_writers:
+                # Давно не писавшийся файл закрывается; следующие строки этого города уйдут в новый файл
+                _, oldest_writer = self.writers.popitem(last=False)
+                oldest_writer.close()
+            part = self.part_counts.get(city, 0)
+            self.part_counts[city] = part + 1
+            partition_dir = os.path.join(self.file_name, f"snapshot_date={self.snapshot_date}",
+                                         f"city={history_partition_value(city)}")
+            os.makedirs(partition_dir, exist_ok=True)
+            writer = self._open_writer(os.path.join(partition_dir, f"part-{self.run_id}-{part}"))
+        self.writers[city] = writer
+        writer.write_table(vacancies_to_arrow(vacancies, self.schema, self.snapshot_at))
+
+    def _open_writer(self, path: str):
+        return pq.ParquetWriter(f"{path}.parquet", self.schema, compression="zstd")
+
+
+class ArrowHistoryDatasetSink(HistoryDatasetSink):
+    # Arrow IPC без сжатия: при чтении файлы отображаются в память и не копируются
+    file_format = "arrow"
+
+    def _open_writer(self, path: str):
+        return pa.ipc.new_file(f"{path}.arrow", self.schema)
+
+
+def open_history_dataset(file_format: str = "parquet", path: str = None) -> "ds.Dataset":
+    if not module_available("pyarrow"):
+        raise ImportError("Для чтения истории нужен пакет pyarrow (pip install pyarrow).")
+    return ds.dataset(path or history_dataset_path(file_format), format="ipc" if file_format == "arrow" else "parquet",
+                      partitioning=history_partitioning(), filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def load_history_responses_per_day(file_format: str = "parquet", path: str = None,
+                                   columns: list[str] = None, filter: "pc.Expression" = None) -> "pa.Table":
+    # Все снимки истории с посчитанным "Откликов в день (среднее)"; фильтр по разделам
+    # (например, ds.field("city") == "Москва") отсекает лишние файлы ещё до чтения
+    columns = columns or ["snapshot_date", "snapshot_at", "city", "link", "title", "company", "responses",
+                          "days_passed"]
+    columns = list(dict.fromkeys(columns + ["responses", "days_passed"]))
+    table = open_history_dataset(file_format, path).to_table(columns=columns, filter=filter)
+    return with_responses_per_day(table)
+
+
+# Форматы выгрузки по расширению файла; history и history_arrow - накопительный набор данных
+SINK_TYPES = {
+    "xlsx": ExcelSink,
+    "csv": CsvSink,
+    "jsonl": JsonLinesSink,
+    "parquet": ParquetSink,
+    "history": HistoryDatasetSink,
+    "history_arrow": ArrowHistoryDatasetSink,
+}
+
+
+def write_vacancies(vacancies: Iterable[Vacancy], sinks: list[VacancySink], batch_size: int = ITEMS_ON_PAGE,
+                    vacancy_index: VacancyIndex = None) -> int:
+    # Стадия выгрузки: вакансии пишутся во все приёмники пачками по мере поступления; возвращает число строк.
+    # vacancy_index - индекс, которым пользовался обход: он фиксируется, только если выгрузка удалась
+    vacancies = iter(vacancies)
+    rows_written = 0
+    completed = False
+    try:
+        while batch := list(itertools.islice(vacancies, batch_size)):
+            write_batch_to_sinks(batch, sinks)
+            rows_written += len(batch)
+        completed = True
+    finally:
+        finish_export(sinks, vacancy_index, completed)
+    return rows_written
+
+
+async def write_vacancies_async(vacancies: AsyncIterator[Vacancy], sinks: list[VacancySink],
+                                batch_size: int = ITEMS_ON_PAGE, vacancy_index: VacancyIndex = None) -> int:
+    rows_written = 0
+    batch = []
+    completed = False
+    try:
+        async for vacancy in vacancies:
+            batch.append(vacancy)
+            if len(batch) >= batch_size:
+                write_batch_to_sinks(batch, sinks)
+                rows_written += len(batch)
+                batch = []
+        write_batch_to_sinks(batch, sinks)
+        rows_written += len(batch)
+        completed = True
+    finally:
+        finish_export(sinks, vacancy_index, completed)
+    return rows_written
+
+
+def write_batch_to_sinks(batch: list[Vacancy], sinks: list[VacancySink]):
+    if not batch:
+        return
+    # Даты форматируются один раз на пачку, готовые строки получают все приёмники
+    with metrics.time("dates"):
+        rows = format_export_batch(batch)
+    for sink in sinks:
+        sink.write_batch(rows)
+    metrics.increment("rows_exported", len(batch))
+
+
+def close_sinks(sinks: list[VacancySink]) -> bool:
+    # Возвращает, удалось ли сохранить все файлы
+    saved = True
+    for sink in sinks:
+        try:
+            sink.close()
+        except Exception as e:
+            saved = False
+            logger.error(f"Ошибка при сохранении в файл {sink.file_name}: {e}")
+    return saved
+
+
+def finish_export(sinks: list[VacancySink], vacancy_index: VacancyIndex | None, completed: bool):
+    # Вакансии становятся известными индексу, только если все они сохранены во все файлы;
+    # после ошибки, прерывания или без единого приёмника следующий прогон выгрузит их снова
+    saved = close_sinks(sinks)
+    if vacancy_index is None:
+        return
+    if completed and saved and sinks:
+        vacancy_index.commit()
+    else:
+        vacancy_index.rollback()
+
+
+def save_to_excel(data: Iterable[Vacancy], with_responses_delta: bool = False):
+    try:
+        rows_written = write_vacancies(data, [ExcelSink(with_responses_delta=with_responses_delta)], batch_size=1000)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении в Excel: {e}")
+        return
+    if not rows_written:
+        logger.warning("Нет данных для сохранения в Excel.")
+
+def is_valid_hh_url(url: str) -> bool:
+    if not url:
+        return False
+    try:
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        parsed_url = urlparse(url)
+        if not parsed_url.netloc.endswith('hh.ru'):
+            return False
+        if 'search/vacancy' not in parsed_url.path:
+            return False
+        return True
+    except Exception:
+        return False